@@ -6,7 +6,9 @@ Each session_id gets its own context dict with conversation history and last fil
 import uuid
 import json
 import os
+import threading
 from typing import Any
+import orjson
 from datetime import datetime
 from pathlib import Path
 from app.core.redis_client import redis_client
@@ -29,10 +31,33 @@ def _load_from_disk():
             print(f"Error loading sessions from disk: {e}")
             _sessions = {}
 
+def _jsonable(obj):
+    # numpy scalars orjson doesn't encode natively expose .item()
+    if hasattr(obj, "item"):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def encode_context(obj) -> bytes:
+    """Serialise a session context (or the whole store) for Redis and disk."""
+    return orjson.dumps(obj, default=_jsonable, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+# Sessions are saved from thread-pool threads; one writer at a time, and each save
+# replaces the file atomically so a reader never sees a partial write
+_disk_lock = threading.Lock()
+
+
 def _save_to_disk():
+    tmp_file = STORAGE_FILE.with_suffix(".json.tmp")
     try:
-        with open(STORAGE_FILE, "w") as f:
-            json.dump(_sessions, f)
+        with _disk_lock:
+            # orjson encodes in one C call that holds the GIL (only `default`
+            # fallbacks run Python), so other threads can't mutate the store mid-dump
+            data = encode_context(_sessions)
+            with open(tmp_file, "wb") as f:
+                f.write(data)
+            os.replace(tmp_file, STORAGE_FILE)
     except Exception as e:
         print(f"Error saving sessions to disk: {e}")
 
@@ -40,14 +65,21 @@ def _save_to_disk():
 _load_from_disk()
 
 MAX_HISTORY = 20  # Max messages to keep per session
+PROMPT_HISTORY_MESSAGES = 4  # Recent messages sent to the intent LLM
 SESSION_TTL = 86400 # 24 hours
 
 
-def _get_redis(session_id: str) -> dict | None:
-    if redis_client is None:
-        return None
+# Marks "not fetched yet" for get_or_create_session's prefetched Redis value
+NOT_FETCHED = object()
+
+
+def session_key(session_id: str) -> str:
+    """Redis key holding a session's context."""
+    return f"session:{session_id}"
+
+
+def _parse(data: str | None) -> dict | None:
     try:
-        data = redis_client.get(f"session:{session_id}")
         if data:
             return json.loads(data)
     except Exception:
@@ -55,24 +87,37 @@ def _get_redis(session_id: str) -> dict | None:
     return None
 
 
+def _get_redis(session_id: str) -> dict | None:
+    if redis_client is None:
+        return None
+    try:
+        return _parse(redis_client.get(session_key(session_id)))
+    except Exception:
+        return None
+
+
 def _set_redis(session_id: str, context: dict):
     if redis_client is None:
         return
     try:
         redis_client.setex(
-            f"session:{session_id}",
+            session_key(session_id),
             SESSION_TTL,
-            json.dumps(context)
+            encode_context(context)
         )
-    except Exception:
-        pass
+    except Exception as e:
+        print(f"[REDIS ERROR] Could not save session {session_id}: {e}")
+
 
+def get_or_create_session(session_id: str | None, stored: str | None = NOT_FETCHED) -> tuple[str, dict]:
+    """Return (session_id, context). Creates a new session if needed.
 
-def get_or_create_session(session_id: str | None) -> tuple[str, dict]:
-    """Return (session_id, context). Creates a new session if needed."""
+    Pass `stored` when the caller already read the session's Redis value (e.g. in a
+    batched MGET); otherwise it is fetched here.
+    """
     if session_id:
         # Try Redis first
-        ctx = _get_redis(session_id)
+        ctx = _get_redis(session_id) if stored is NOT_FETCHED else _parse(stored)
         if ctx:
             return session_id, ctx
         
@@ -90,8 +135,8 @@ def get_or_create_session(session_id: str | None) -> tuple[str, dict]:
         "last_group_by": None,
         "last_metric": None,
         "last_column": None,
-        "pattern_log": [],            # [{metric_type, deviation_pct, timestamp}]
-        "last_query_result": None,    # {metric, value, segment} for cross-question validator
+        "pattern_index": {},          # {metric_type: {"values": [...], "timestamps": [ns, ...], "next": slot}}
+        "last_query_result": None,    # [metric, value] for cross-question validator
         "created_at": datetime.utcnow().isoformat(),
         "last_updated": datetime.utcnow().isoformat(),
     }
@@ -103,9 +148,14 @@ def get_or_create_session(session_id: str | None) -> tuple[str, dict]:
     return session_id, new_ctx
 
 
-def update_context(session_id: str, query_plan: dict, user_message: str, assistant_response: str, response_data: dict = None):
-    """Persist the latest query plan and conversation turn into session context."""
-    session_id, ctx = get_or_create_session(session_id)
+def update_context(session_id: str, query_plan: dict, user_message: str, assistant_response: str, response_data: dict = None, ctx: dict = None, save_redis: bool = True):
+    """Persist the latest query plan and conversation turn into session context.
+
+    Pass `ctx` when the caller already holds the session context; otherwise it is looked up.
+    With `save_redis=False` the caller writes the context to `session_key(session_id)` itself.
+    """
+    if ctx is None:
+        session_id, ctx = get_or_create_session(session_id)
 
     # Update last known filters / dimensions for follow-up resolution
     if query_plan.get("filters"):
@@ -137,7 +187,8 @@ def update_context(session_id: str, query_plan: dict, user_message: str, assista
     
     # Save back
     _sessions[session_id] = ctx
-    _set_redis(session_id, ctx)
+    if save_redis:
+        _set_redis(session_id, ctx)
     _save_to_disk()
 
 
@@ -147,6 +198,15 @@ def get_conversation_history(session_id: str) -> list[dict]:
     return ctx.get("conversation_history", [])
 
 
+def get_prompt_history(session_id: str, ctx: dict = None) -> list[dict]:
+    """Return the last few turns as bare {role, content} messages for the LLM prompt."""
+    if ctx is None:
+        _, ctx = get_or_create_session(session_id)
+    history = ctx.get("conversation_history", [])
+    # Response metadata stays out of the prompt; it is only used by the History UI
+    return [{"role": t["role"], "content": t["content"]} for t in history[-PROMPT_HISTORY_MESSAGES:]]
+
+
 def delete_history_item(session_id: str, index: int):
     """Remove a specific user-assistant turn from history (turn = 2 entries)."""
     _, ctx = get_or_create_session(session_id)
@@ -178,6 +238,6 @@ def clear_session(session_id: str):
     if redis_client is None:
         return
     try:
-        redis_client.delete(f"session:{session_id}")
+        redis_client.delete(session_key(session_id))
     except Exception:
         pass
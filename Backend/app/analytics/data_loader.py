@@ -0,0 +1,68 @@
+"""
+Transactions dataset loader.
+The source CSV is parsed once and cached as Parquet next to it, with low-cardinality
+text columns stored as categoricals and flags/hours as the smallest integer types.
+Later loads read the Parquet file, which is far faster and lighter than the CSV.
+"""
+
+import os
+
+import pandas as pd
+
+CSV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "ml", "upi_transactions_2024.csv"))
+PARQUET_PATH = os.path.splitext(CSV_PATH)[0] + ".parquet"
+
+# Common CSV header variants -> names the analytics code expects
+COLUMN_ALIASES = {
+    "amount_(inr)": "amount",
+    "transaction_status": "status",
+    "sender_age_group": "age_group",
+    "sender_state": "state",
+}
+
+CATEGORICAL_COLUMNS = (
+    "merchant_category", "device_type", "network_type", "state", "age_group", "day_of_week",
+    "status", "transaction_type", "receiver_age_group", "sender_bank", "receiver_bank",
+)
+SMALL_INT_COLUMNS = ("fraud_flag", "hour_of_day")
+
+
+def load_transactions() -> pd.DataFrame:
+    """Return the transactions DataFrame, building the Parquet cache if it is missing or stale."""
+    if os.path.exists(PARQUET_PATH) and os.path.getmtime(PARQUET_PATH) >= os.path.getmtime(CSV_PATH):
+        try:
+            return pd.read_parquet(PARQUET_PATH, engine="pyarrow")
+        except Exception as e:
+            print(f"[WARNING] Could not read Parquet cache, re-reading CSV: {e}")
+
+    df = _prepare(pd.read_csv(CSV_PATH))
+    try:
+        # Written aside and swapped in, so a crash or a concurrent worker never leaves
+        # a truncated file that looks newer than the CSV
+        tmp = f"{PARQUET_PATH}.{os.getpid()}.tmp"
+        df.to_parquet(tmp, engine="pyarrow", compression="zstd", use_dictionary=True, index=False)
+        os.replace(tmp, PARQUET_PATH)
+    except Exception as e:
+        print(f"[WARNING] Could not write Parquet cache: {e}")
+    return df
+
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    # Normalise column names to lowercase with underscores
+    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    df = df.rename(columns={k: v for k, v in COLUMN_ALIASES.items() if k in df.columns})
+
+    if "timestamp" in df.columns:
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
+    if "amount" in df.columns:
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce")
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in SMALL_INT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(pd.to_numeric(df[col], errors="coerce").fillna(0), downcast="integer")
+    if "is_weekend" in df.columns:
+        df["is_weekend"] = df["is_weekend"].astype(bool)
+    return df
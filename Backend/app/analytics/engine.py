@@ -1,20 +1,24 @@
 """
 UPI Transactions Analytics Engine
-Loads the CSV once at startup and exposes typed query functions.
+Loads the dataset once at startup and exposes typed query functions.
 """
 
-import os
 import pandas as pd
 import numpy as np
 from functools import lru_cache
 from typing import Optional
 
-# -- Dataset path ------------------------------------------------------------------
-_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "ml", "upi_transactions_2024.csv")
+from app.analytics.data_loader import load_transactions
 
 # -- Global DataFrame (loaded once on import) -----------------------------------
 _df: Optional[pd.DataFrame] = None
 
+# Bumped on every (re)load; memoised aggregates are keyed on it
+_DATA_VERSION = 0
+
+# Aggregates derived from _df; reset whenever the dataset is (re)loaded
+_heatmap: Optional[dict] = None
+
 
 def load_data() -> pd.DataFrame:
     """Load and pre-process the CSV (called once at startup)."""
@@ -22,18 +26,8 @@ def load_data() -> pd.DataFrame:
     if _df is not None:
         return _df
 
-    df = pd.read_csv(_csv_path())
-    # Normalise column names to lowercase with underscores
-    df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
-
-    # Explicitly map common CSV variants to expected logic names
-    mapping = {
-        "amount_(inr)": "amount",
-        "transaction_status": "status",
-        "sender_age_group": "age_group",
-        "sender_state": "state",
-    }
-    df = df.rename(columns={k: v for k, v in mapping.items() if k in df.columns})
+    # Column names are normalised and dtypes compacted by the loader
+    df = load_transactions()
 
     # Parse datetime columns if present
     for col in ["timestamp", "date", "transaction_date", "datetime"]:
@@ -53,14 +47,13 @@ def load_data() -> pd.DataFrame:
     if "fraud_flag" in df.columns:
         df["fraud_flag"] = pd.to_numeric(df["fraud_flag"], errors="coerce").fillna(0)
 
+    global _heatmap, _DATA_VERSION
     _df = df
+    _heatmap = None
+    _DATA_VERSION += 1
     return _df
 
 
-def _csv_path() -> str:
-    return os.path.abspath(_CSV_PATH)
-
-
 def get_df() -> pd.DataFrame:
     global _df
     if _df is None:
@@ -68,6 +61,12 @@ def get_df() -> pd.DataFrame:
     return _df
 
 
+def get_data_version() -> int:
+    """Counter identifying the currently loaded dataset (for caches keyed on it)."""
+    get_df()
+    return _DATA_VERSION
+
+
 def _apply_date_filter(df: pd.DataFrame, timeframe: str) -> pd.DataFrame:
     """Filter DataFrame by a relative timeframe (e.g., 'last month', 'yesterday')."""
     time_col = next((c for c in ["timestamp", "date", "transaction_date", "datetime"] if c in df.columns), None)
@@ -112,7 +111,12 @@ def _apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
             df = _apply_date_filter(df, str(val))
         elif col in df.columns:
             col_series = df[col]
-            if col_series.dtype == object:
+            if isinstance(col_series.dtype, pd.CategoricalDtype):
+                # Match on the handful of categories instead of lowercasing every row
+                wanted = str(val).lower()
+                matches = [c for c in col_series.cat.categories if str(c).lower() == wanted]
+                df = df[col_series.isin(matches)]
+            elif pd.api.types.is_string_dtype(col_series):
                 df = df[col_series.str.lower() == str(val).lower()]
             else:
                 df = df[col_series == val]
@@ -123,6 +127,12 @@ def _apply_filters(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
 
 def get_summary_stats() -> dict:
     """Overall KPI summary for the dashboard."""
+    # Static per dataset load; hand out a copy so callers can't alter the memo
+    return dict(_summary_stats(get_data_version()))
+
+
+@lru_cache(maxsize=4)
+def _summary_stats(version: int) -> dict:
     df = get_df()
     total = len(df)
     avg_amount = df["amount"].mean() if "amount" in df.columns else 0
@@ -465,6 +475,45 @@ def query_multi_segmentation(dim1: str, dim2: str, metric: str, column: str) ->
         "chart_type": "stacked_bar"
     }
 
+HEATMAP_SLOTS = ["Morning", "Afternoon", "Evening", "Night"]
+# hour_of_day (0-23) -> index into HEATMAP_SLOTS; late evening and early morning are Night
+_SLOT_OF_HOUR = np.array([3] * 5 + [0] * 7 + [1] * 5 + [2] * 4 + [3] * 3, dtype=np.int8)
+
+
+def get_heatmap_risk(max_states: int = 15) -> dict:
+    """Fraud rate (%) per state and time slot, as a dense states x slots matrix.
+    Computed once per dataset load."""
+    global _heatmap
+    if _heatmap is not None:
+        return _heatmap
+
+    df = get_df()
+    n_slots = len(HEATMAP_SLOTS)
+    slots = _SLOT_OF_HOUR[df["hour_of_day"].to_numpy()]
+    if isinstance(df["state"].dtype, pd.CategoricalDtype):
+        states, names = df["state"].cat.codes.to_numpy(), df["state"].cat.categories
+    else:
+        states, names = pd.factorize(df["state"], sort=True)
+
+    # (state, slot) sums and counts in two flat bincount passes instead of a
+    # groupby + unstack; rows with a missing state (code -1) are dropped
+    keep = states >= 0
+    cell = states[keep].astype(np.int64) * n_slots + slots[keep]
+    size = len(names) * n_slots
+    sums = np.bincount(cell, weights=df["fraud_flag"].to_numpy(dtype=np.float64)[keep], minlength=size)
+    counts = np.bincount(cell, minlength=size)
+    sums, counts = sums.reshape(-1, n_slots), counts.reshape(-1, n_slots)
+    rates = np.divide(sums * 100, counts, out=np.zeros_like(sums), where=counts > 0)
+
+    observed = np.flatnonzero(counts.sum(axis=1))[:max_states]  # states present in the data, sorted; top 15 for UI
+    _heatmap = {
+        "states": [str(names[i]) for i in observed],
+        "slots": list(HEATMAP_SLOTS),
+        "values": rates[observed].round(2).tolist(),  # values[state][slot], percent
+    }
+    return _heatmap
+
+
 def get_column_names() -> list[str]:
     """Return available column names for the LLM prompt context."""
     return get_df().columns.tolist()
@@ -538,6 +587,12 @@ def generate_dashboard_data(metric: str = "avg", column: str = "amount", filters
     }
 def get_benchmark_comparison() -> dict:
     """Calculates MoM and YoY growth for key metrics."""
+    # Static per dataset load, like the summary stats
+    return dict(_benchmark_comparison(get_data_version()))
+
+
+@lru_cache(maxsize=4)
+def _benchmark_comparison(version: int) -> dict:
     df = get_df()
     time_col = next((c for c in ["timestamp", "date", "transaction_date", "datetime"] if c in df.columns), None)
     if not time_col:
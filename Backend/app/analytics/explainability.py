@@ -3,6 +3,7 @@ Explainability Engine — converts raw analytics results into rich natural-langu
 """
 
 import json
+from functools import lru_cache
 from typing import Any
 from app.core.llm import call_llm
 
@@ -462,9 +463,8 @@ def format_multi_segmentation_response(plan: dict, result: dict) -> str:
     return "\n".join(lines)
 
 
-async def generate_rag_response(question: str, context: str) -> str:
-    """Uses LLM to generate a structured answer based ONLY on retrieved CSV context."""
-    system_prompt = f"""You are a Transaction Analytics Engine for InsightX — a UPI fraud intelligence system.
+# Static part of the RAG system prompt; only the retrieved context varies per call.
+_RAG_SYSTEM_PROMPT = """You are a Transaction Analytics Engine for InsightX — a UPI fraud intelligence system.
 You MUST answer ONLY using the transaction data fragments provided below.
 
 CRITICAL RULES:
@@ -494,14 +494,19 @@ Confidence:
 - High / Medium / Low with justification
 
 ## Transaction Data Context:
-{context}
 """
+
+
+async def generate_rag_response(question: str, context: str) -> str:
+    """Uses LLM to generate a structured answer based ONLY on retrieved CSV context."""
     messages = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": _RAG_SYSTEM_PROMPT + context + "\n"},
         {"role": "user", "content": question}
     ]
 
     try:
+        # The mandatory five-section structure with figures needs several hundred
+        # tokens; 800 leaves headroom without allowing runaway answers.
         return await call_llm(messages, temperature=0.1, max_tokens=800)
     except Exception:
         return "Query cannot be resolved using available dataset dimensions."
@@ -550,8 +555,21 @@ def format_error_response(error: str) -> str:
 def _describe_filters(filters: dict) -> str:
     if not filters:
         return ""
+    try:
+        return _describe_filters_cached(tuple(filters.items()))
+    except TypeError:
+        # Unhashable filter values (lists/dicts from the LLM plan) skip the cache
+        return _describe_filter_items(filters.items())
+
+
+@lru_cache(maxsize=256)
+def _describe_filters_cached(items: tuple) -> str:
+    return _describe_filter_items(items)
+
+
+def _describe_filter_items(items) -> str:
     parts = []
-    for k, v in filters.items():
+    for k, v in items:
         if k == "peak_hours":
             parts.append("peak hours")
         elif k == "weekend":
@@ -561,6 +579,7 @@ def _describe_filters(filters: dict) -> str:
     return ", ".join(parts)
 
 
+@lru_cache(maxsize=64)
 def _col_label(column: str) -> str:
     mapping = {
         "amount": "Transaction Amount",
@@ -570,6 +589,7 @@ def _col_label(column: str) -> str:
     return mapping.get(column, column.replace("_", " ").title())
 
 
+@lru_cache(maxsize=64)
 def _metric_label(metric: str) -> str:
     mapping = {
         "avg": "Average",
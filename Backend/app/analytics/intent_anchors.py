@@ -0,0 +1,53 @@
+"""
+Embedding-based intent routing for the classifier's middle tier.
+One canonical sentence per intent is embedded once with the RAG engine's MiniLM
+model; a message is scored against all anchors with a single matrix-vector product.
+"""
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+from app.analytics import intent_cache
+
+MIN_SCORE = 0.78   # Best anchor must be at least this similar...
+MIN_MARGIN = 0.08  # ...and this far ahead of the runner-up
+
+# Every intent gets an anchor, even ones the caller can't answer without the LLM,
+# so that the margin test compares against all competing readings of a message.
+ANCHORS = {
+    "aggregation": "what is the average transaction amount",
+    "comparison": "compare the average amount between android and ios",
+    "temporal": "what are the peak transaction hours",
+    "segmentation": "break down spending by merchant category",
+    "risk": "what is the overall fraud rate",
+    "distribution": "show the distribution of transaction amounts",
+    "correlation": "is there a relationship between amount and hour of day",
+    "multi_segmentation": "fraud rate by state and device type",
+    "dashboard": "build a full dashboard report of all metrics",
+    "rag": "suggest a strategy to reduce fraud losses",
+    "ambiguous": "tell me something interesting",
+}
+
+_intents = list(ANCHORS)
+_matrix: Optional[np.ndarray] = None  # one unit-length anchor embedding per row
+_lock = threading.Lock()
+
+
+def _anchor_matrix() -> np.ndarray:
+    global _matrix
+    if _matrix is None:
+        with _lock:
+            if _matrix is None:
+                _matrix = np.stack([intent_cache.embed(intent_cache.normalize(s)) for s in ANCHORS.values()])
+    return _matrix
+
+
+def classify(message: str) -> Optional[str]:
+    """Return the intent whose anchor clearly wins for this message, else None."""
+    scores = _anchor_matrix() @ intent_cache.embed(intent_cache.normalize(message))
+    runner_up, best = np.argsort(scores)[-2:]
+    if scores[best] < MIN_SCORE or scores[best] - scores[runner_up] < MIN_MARGIN:
+        return None
+    return _intents[best]
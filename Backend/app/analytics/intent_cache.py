@@ -0,0 +1,147 @@
+"""
+QueryPlan caches for the intent classifier.
+- Exact tier: identical message + conversation context -> plan (LRU, no embedding work),
+  mirrored to Redis so plans are shared across workers.
+- Semantic tier: messages are embedded with the RAG engine's MiniLM model and matched
+  by cosine similarity against a small in-memory FAISS inner-product index.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from functools import lru_cache
+from typing import Optional
+
+import faiss
+import numpy as np
+from cachetools import LRUCache
+
+from app.analytics.rag_engine import rag_engine
+
+# Redis is optional — if unavailable the shared tier is simply skipped
+try:
+    from app.core.redis_client import async_redis_client
+except Exception:
+    async_redis_client = None
+
+# -- Exact tier --------------------------------------------------------------------
+# Both tiers share one key per (normalised message, context): the local LRU answers
+# repeats without a round trip, Redis shares plans across workers.
+
+_exact: LRUCache = LRUCache(maxsize=2048)  # exact_key -> plan JSON
+
+
+def context_key(last_context: dict, history: list[dict]) -> str:
+    """Short digest of everything besides the message that the LLM sees."""
+    payload = {
+        "context": {k: last_context.get(k) for k in ("last_category", "last_metric", "last_column", "last_group_by")},
+        "history": [(t.get("role"), t.get("content")) for t in history],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def exact_key(message: str, ctx_key: str) -> str:
+    """Cache key for a message in a context; case, whitespace runs and trailing
+    punctuation don't split it."""
+    norm = " ".join(message.lower().split()).rstrip("?!. ")
+    return "plan:" + hashlib.blake2b(f"{norm}|{ctx_key}".encode(), digest_size=16).hexdigest()
+
+
+def get_exact(key: str) -> Optional[dict]:
+    cached = _exact.get(key)
+    return json.loads(cached) if cached else None
+
+
+def put_exact(key: str, plan: dict):
+    _exact[key] = json.dumps(plan)
+
+
+SHARED_TTL_S = 600
+
+_shared_writes: set[asyncio.Task] = set()  # strong refs so writes aren't GC'd mid-flight
+
+
+async def get_shared(key: str) -> Optional[dict]:
+    """Exact-tier lookup in Redis; a hit is also kept in the local LRU."""
+    if async_redis_client is None:
+        return None
+    try:
+        cached = await async_redis_client.get(key)
+    except Exception:
+        return None
+    if not cached:
+        return None
+    _exact[key] = cached
+    return json.loads(cached)
+
+
+def put_shared(key: str, plan: dict):
+    """Write a plan to Redis in the background; the caller doesn't wait for it."""
+    if async_redis_client is None:
+        return
+    task = asyncio.create_task(_write_shared(key, json.dumps(plan)))
+    _shared_writes.add(task)
+    task.add_done_callback(_shared_writes.discard)
+
+
+async def _write_shared(key: str, value: str):
+    try:
+        await async_redis_client.setex(key, SHARED_TTL_S, value)
+    except Exception:
+        pass
+
+
+# -- Semantic tier -----------------------------------------------------------------
+
+SIMILARITY_THRESHOLD = 0.92
+MAX_ENTRIES = 1024  # Oldest plans are evicted first once full
+
+# Index rows and _plans entries are kept aligned (row i <-> _plans[i])
+_index: Optional[faiss.IndexFlatIP] = None
+_plans: list[str] = []
+_lock = threading.Lock()
+
+
+def normalize(message: str) -> str:
+    return message.lower().strip()
+
+
+@lru_cache(maxsize=512)
+def embed(message: str) -> np.ndarray:
+    """Unit-length float32 embedding, so inner product == cosine similarity."""
+    vec = np.asarray(rag_engine.embeddings.embed_query(message), dtype="float32")
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def lookup(message: str) -> Optional[dict]:
+    """Return a copy of the closest cached plan if it is similar enough."""
+    if _index is None or _index.ntotal == 0:
+        return None
+
+    query = embed(normalize(message))[np.newaxis, :]
+    with _lock:
+        scores, ids = _index.search(query, 1)
+        row = int(ids[0][0])
+        if row < 0 or scores[0][0] < SIMILARITY_THRESHOLD:
+            return None
+        plan = json.loads(_plans[row])
+
+    plan["context_used"] = True
+    return plan
+
+
+def store(message: str, plan: dict):
+    """Add a freshly classified plan to the cache."""
+    global _index
+    vec = embed(normalize(message))[np.newaxis, :]
+    with _lock:
+        if _index is None:
+            _index = faiss.IndexFlatIP(vec.shape[1])
+        if _index.ntotal >= MAX_ENTRIES:
+            _index.remove_ids(np.array([0], dtype="int64"))
+            _plans.pop(0)
+        _index.add(vec)
+        _plans.append(json.dumps(plan))
@@ -4,147 +4,317 @@ Uses OpenRouter API with a few-shot system prompt.
 """
 
 import os
-import json
+import copy
 import re
-import httpx
+import asyncio
+import orjson
+from importlib import resources
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.core.llm import call_llm
+from app.core.llm_batcher import classify_batched
+from app.analytics import intent_anchors, intent_cache
 
 # -- System Prompt ------------------------------------------------------------------
+# Kept as a package resource so the prompt can be edited without touching code.
+# Blank lines and whitespace runs are dropped at load; they cost tokens on every call.
 
-SYSTEM_PROMPT = """You are an AI Query Planner for a UPI Transactions Analytics system.
-Your job is to parse the user's business question into a structured JSON QueryPlan.
-
-## Dataset Columns Available:
-- amount (float): transaction amount in INR
-- merchant_category (str): Food, Entertainment, Grocery, Fuel, Travel, Shopping, Healthcare, Education, Utilities, etc.
-- device_type (str): Android, iOS, Web
-- network_type (str): 5G, 4G, 3G, WiFi
-- state (str): Indian states
-- age_group (str): 18-25, 26-35, 36-45, 46-60, 60+
-- hour_of_day (int): 0-23
-- day_of_week (str): Monday-Sunday
-- is_weekend (bool)
-- fraud_flag (int): 1 = fraud, 0 = legit
-- status (str): SUCCESS, FAILED, PENDING
-
-## Intent Types:
-- aggregation: single metric (avg/sum/count/rate) with optional filters
-- comparison: compare a metric across groups (group_by)
-- temporal: peak hours, day-of-week analysis
-- segmentation: breakdown by age_group, state, merchant_category, etc.
-- risk: fraud rate, failure rate analysis
-- distribution: frequency breakdown of a numeric column (histogram)
-- correlation: relationship between two numeric columns (scatter)
-- multi_segmentation: breakdown by two dimensions (e.g., state AND category) for stacked/grouped charts
-- dashboard: create a full report/dashboard with multiple charts, KPIs, and insights
-- rag: general/complex questions about patterns, ML modeling, strategy, or advisory
-- ambiguous: unclear question, needs clarification
-
-## Recommended Charts:
-bar, line, pie, donut, area, stacked_bar, grouped_bar, histogram, scatter
-
-## Output Format (JSON only):
-{
-  "intent": "aggregation|comparison|temporal|segmentation|risk|distribution|correlation|multi_segmentation|dashboard|rag|ambiguous",
-  "metric": "avg|sum|count|rate",
-  "column": "amount|fraud_flag",
-  "filters": {},
-  "group_by": null,
-  "segment_col": null,
-  "secondary_segment": null,
-  "recommended_chart": "bar|line|pie|donut|area|stacked_bar|grouped_bar|histogram|scatter",
-  "recommended_charts": ["bar", "line"],
-  "needs_clarification": false,
-  "clarification_question": null
+def _compact_prompt(text: str) -> str:
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+SYSTEM_PROMPT = _compact_prompt(
+    resources.files("app.analytics").joinpath("intent_system_prompt.txt").read_text(encoding="utf-8")
+)
+
+
+# Output budget for a QueryPlan. A valid plan is well under 150 tokens, so the
+# first attempt asks for 200; only a truncated (unparseable) reply is retried
+# with the larger budget, which leaves room for a long clarification_question.
+PLAN_MAX_TOKENS = 200
+PLAN_RETRY_MAX_TOKENS = 512
+
+# -- Structured output ----------------------------------------------------------------
+# The plan shape from the prompt, sent as a JSON schema so the provider constrains
+# decoding to valid JSON (no markdown fences, no prose). Not "strict": `filters` is
+# a free-form object, which strict mode does not allow.
+
+INTENTS = [
+    "aggregation", "comparison", "temporal", "segmentation", "risk", "distribution",
+    "correlation", "multi_segmentation", "dashboard", "rag", "ambiguous",
+]
+CHARTS = ["bar", "line", "pie", "donut", "area", "stacked_bar", "grouped_bar", "histogram", "scatter"]
+
+_NULLABLE_STR = {"type": ["string", "null"]}
+
+QUERY_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": INTENTS},
+        "metric": {"type": "string", "enum": ["avg", "sum", "count", "rate"]},
+        "column": {"type": "string"},
+        "filters": {"type": "object"},
+        "group_by": _NULLABLE_STR,
+        "segment_col": _NULLABLE_STR,
+        "secondary_segment": _NULLABLE_STR,
+        "recommended_chart": {"type": ["string", "null"], "enum": CHARTS + [None]},
+        "recommended_charts": {"type": "array", "items": {"type": "string", "enum": CHARTS}},
+        "needs_clarification": {"type": "boolean"},
+        "clarification_question": _NULLABLE_STR,
+    },
+    "required": ["intent", "metric", "column", "filters", "needs_clarification"],
+}
+
+PLAN_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "QueryPlan", "schema": QUERY_PLAN_SCHEMA, "strict": False},
 }
 
-## Multi-Chart Generation:
-- If the user explicitly asks for **multiple diagrams** (e.g., "show bar and pie", "generate histogram and lineplot"), you MUST populate the `recommended_charts` list with all requested types.
-- If the user asks for a **dashboard** or uses words like "detailed analysis", "full report", or "all metrics", you should suggest 3-4 appropriate charts in `recommended_charts`.
 
-## Few-shot Examples:
+# -- Deterministic pre-routing -------------------------------------------------------
+# Unambiguous phrasings documented in the prompt's keyword heuristics are answered
+# without an LLM round trip. Patterns bail out on filter/dimension words so that
+# anything more specific still reaches the model.
 
-Q: "Show category spending as a donut chart"
-A: {"intent":"segmentation","metric":"sum","column":"amount","filters":{},"group_by":null,"segment_col":"merchant_category","recommended_chart":"donut","needs_clarification":false}
+def _rule_plan(intent: str, metric: str, column: str, charts: list[str], **fields) -> dict:
+    plan = {
+        "intent": intent,
+        "metric": metric,
+        "column": column,
+        "filters": {},
+        "group_by": None,
+        "segment_col": None,
+        "secondary_segment": None,
+        "recommended_chart": charts[0] if charts else None,
+        "recommended_charts": charts,
+        "needs_clarification": False,
+        "clarification_question": None,
+    }
+    plan.update(fields)
+    return plan
 
-Q: "Propose an ML modeling strategy for 95/5 fraud split"
-A: {"intent":"rag","metric":"avg","column":"fraud_flag","filters":{},"group_by":null,"segment_col":null,"recommended_chart":null,"needs_clarification":false}
 
-Q: "Trend of transactions this week as an area chart"
-A: {"intent":"temporal","metric":"count","column":"amount","filters":{"timeframe":"last week"},"group_by":null,"segment_col":null,"recommended_chart":"area","needs_clarification":false}
+# Words users say -> dataset columns, for captured dimensions
+_DIMENSION_ALIASES = {
+    "state": "state", "states": "state", "region": "state", "regions": "state",
+    "device": "device_type", "devices": "device_type", "device_type": "device_type",
+    "category": "merchant_category", "categories": "merchant_category",
+    "merchant": "merchant_category", "merchants": "merchant_category",
+    "merchant_category": "merchant_category",
+    "age": "age_group", "age_group": "age_group",
+    "network": "network_type", "networks": "network_type", "network_type": "network_type",
+    "day": "day_of_week", "days": "day_of_week", "day_of_week": "day_of_week",
+    "status": "status",
+}
 
-Q: "Fraud by state and device type as a stacked bar"
-A: {"intent":"multi_segmentation","metric":"rate","column":"fraud_flag","filters":{},"group_by":null,"segment_col":"state","secondary_segment":"device_type","recommended_chart":"stacked_bar","needs_clarification":false}
+# Column-ish words that aren't dimension aliases ("transaction type", "age group", ...)
+_OTHER_COLUMN_WORDS = r"types?|groups?|codes?|banks?|weekends?|weekdays?"
 
-Q: "Compare Android vs iOS spending side by side"
-A: {"intent":"comparison","metric":"avg","column":"amount","filters":{},"group_by":"device_type","segment_col":null,"recommended_chart":"grouped_bar","needs_clarification":false}
+# Category values from the dataset and timeframe words. Either one means the answer
+# needs filters, which a fixed plan doesn't carry. Age groups are caught as digits.
+_FILTER_VALUES = (
+    # device_type, network_type
+    "android", "ios", "web", "3g", "4g", "5g", "wifi",
+    # state
+    "andhra pradesh", "delhi", "gujarat", "karnataka", "maharashtra", "rajasthan",
+    "tamil nadu", "telangana", "uttar pradesh", "west bengal",
+    # merchant_category
+    "education", "entertainment", "food", "fuel", "grocery", "groceries", "healthcare",
+    "shopping", "transport", "travel", "utilities",
+    # transaction_type, status, banks
+    "p2p", "p2m", "bill payments?", "recharges?", "failed", "failures?", "success", "successful",
+    "axis", "hdfc", "icici", "indusind", "kotak", "pnb", "sbi", "yes bank",
+    # day_of_week
+    "mondays?", "tuesdays?", "wednesdays?", "thursdays?", "fridays?", "saturdays?", "sundays?",
+)
+_TIMEFRAME_WORDS = (
+    "last", "past", "recent", "recently", "ago", "yesterday", "today", "this",
+    "weeks?", "months?", "quarters?", "years?",
+)
+_QUALIFIER_WORDS = "|".join(v.replace(" ", r"\s+") for v in _FILTER_VALUES + _TIMEFRAME_WORDS)
 
-Q: "Transaction amount distribution"
-A: {"intent":"distribution","metric":"count","column":"amount","filters":{},"group_by":null,"segment_col":null,"recommended_chart":"histogram","needs_clarification":false}
+# Rules never fire on a filter value or timeframe ("Android dashboard", "amount
+# distribution last month"); those need a plan with filters
+_UNQUALIFIED = r"(?!.*\b(?:" + _QUALIFIER_WORDS + r")\b)"
 
-Q: "Is there a correlation between amount and time of day?"
-A: {"intent":"correlation","metric":"avg","column":"amount","filters":{},"group_by":null,"segment_col":"hour_of_day","recommended_chart":"scatter","needs_clarification":false}
+# The distribution rule only answers for amounts: it bails on any dimension or other
+# column word, and on "distribution of <something other than amount>"
+_NOT_AMOUNT = (
+    _UNQUALIFIED
+    + r"(?!.*\b(?:by|per|across|for|vs|versus|and|between|fraud|hours?|time|"
+    + _OTHER_COLUMN_WORDS + "|"
+    + "|".join(_DIMENSION_ALIASES)
+    + r")\b)"
+    r"(?!.*\b(?:distribution|histogram|spread)\s+(?:of|in)\s+(?!(?:the\s+)?(?:transaction\s+|payment\s+)?amounts?\b))"
+)
+
+_RULES: list[tuple[re.Pattern, dict]] = [
+    (
+        re.compile(r"^" + _NOT_AMOUNT + r".*\b(?:distribution|histogram|spread)\b", re.IGNORECASE),
+        _rule_plan("distribution", "count", "amount", ["histogram"]),
+    ),
+    (
+        re.compile(
+            r"^" + _UNQUALIFIED + r"(?!.*\b(?:for|of|in|on|during|where|only|"
+            + _OTHER_COLUMN_WORDS + "|" + "|".join(_DIMENSION_ALIASES)
+            + r")\b).*\b(?:dashboard|full report|all metrics)\b",
+            re.IGNORECASE,
+        ),
+        _rule_plan("dashboard", "avg", "amount", ["bar", "area", "donut"]),
+    ),
+    (
+        # Captured groups become segment_col / secondary_segment
+        re.compile(r"^" + _UNQUALIFIED + r"(?!.*\b(?:for|during|where|only)\b).*\bfraud\b.*?\bby\s+(\w+)(?:\s+type)?\s+and\s+(\w+)", re.IGNORECASE),
+        _rule_plan("multi_segmentation", "rate", "fraud_flag", ["stacked_bar"]),
+    ),
+]
+
+
+def _route_by_rules(user_message: str) -> Optional[dict]:
+    """Return a QueryPlan for messages matching a deterministic rule, else None."""
+    for pattern, template in _RULES:
+        match = pattern.search(user_message)
+        if not match:
+            continue
+        plan = copy.deepcopy(template)
+        if match.groups():
+            dims = [_DIMENSION_ALIASES.get(g.lower()) for g in match.groups()]
+            if not all(dims) or dims[0] == dims[1]:
+                continue
+            plan["segment_col"], plan["secondary_segment"] = dims
+        return plan
+    return None
+
+
+# -- Anchor routing ------------------------------------------------------------------
+# Intents that can be answered from the message alone. A message routed here gets a
+# fixed plan, so anything carrying a dimension, filter or number goes to the LLM.
+
+_ANCHOR_PLANS = {
+    "aggregation": _rule_plan("aggregation", "avg", "amount", ["bar"]),
+    "temporal": _rule_plan("temporal", "count", "amount", ["line"]),
+    "risk": _rule_plan("risk", "rate", "fraud_flag", ["bar"]),
+    "distribution": _rule_plan("distribution", "count", "amount", ["histogram"]),
+    "dashboard": _rule_plan("dashboard", "avg", "amount", ["bar", "area", "donut"]),
+    "rag": _rule_plan("rag", "avg", "amount", []),
+}
+
+_SPECIFIC = re.compile(
+    r"\d|\b(?:by|per|across|for|in|on|from|during|vs|versus|between|where|only|among|"
+    + _OTHER_COLUMN_WORDS + "|"
+    + _QUALIFIER_WORDS + "|"
+    + "|".join(_DIMENSION_ALIASES)
+    + r")\b",
+    re.IGNORECASE,
+)
+
+
+def _route_by_anchor(user_message: str) -> Optional[dict]:
+    """Return a QueryPlan if the message clearly matches a parameter-free intent."""
+    intent = intent_anchors.classify(user_message)
+    if intent not in _ANCHOR_PLANS:
+        return None
+    # Advisory answers are written from the message text, so scoping words don't matter
+    if intent != "rag" and _SPECIFIC.search(user_message):
+        return None
+    return copy.deepcopy(_ANCHOR_PLANS[intent])
 
-RULES:
-- **Autonomous Visualization**: If the prompt contains "show", "difference", "generate", "diagram", "comparison", or "visualize", YOU MUST select a `recommended_chart`. Do NOT ask the user which chart they want.
-- **Strategic Advisory**: If the user asks for "strategy", "advice", "ml", "modeling", "sampling", or "how should we handle", map to `rag` intent.
-- **Expert Mapping (Component-Count)**:
-    - If the user is comparing **multiple components/categories** (e.g., "all states", "all categories", "breakdown by all"), use `pie` or `donut`.
-    - If the user is comparing **exactly 2 components** (e.g., "Android vs iOS", "Fraud vs Legit", "Today vs Yesterday"), use `bar` or `histogram` (if numeric).
-- Keyword Heuristics:
-    - "trend", "over time", "history" -> area or line.
-    - "difference", "comparison", "vs" -> grouped_bar (for 2 items) or stacked_bar (for categories).
-    - "distribution", "spread" -> histogram.
-- Output ONLY valid JSON.
-"""
+
+# Session context fields that make a message a follow-up rather than a standalone
+# question, with the label each gets in the context hint sent to the model
+_CTX_KEYS = (
+    ("last_category", "Last discussed category"),
+    ("last_metric", "Last metric"),
+    ("last_column", "Last column"),
+    ("last_group_by", "Last group_by"),
+)
+_CONTEXT_KEYS = tuple(key for key, _ in _CTX_KEYS)
+
+
+def has_context(last_context: dict) -> bool:
+    """Whether a session carries follow-up context, i.e. its answers depend on it."""
+    return any(last_context.get(k) for k in _CONTEXT_KEYS)
 
 
 async def classify_intent(
     user_message: str,
-    conversation_history: list[dict],
+    conversation_history: list[dict],  # bounded {role, content} turns
     last_context: dict,
 ) -> dict:
     """
     Send the user message + context to the LLM and return a parsed QueryPlan dict.
     Tries each model in MODELS in order; falls back on any error.
     """
-    # Build context hint
-    context_notes = []
-    if last_context.get("last_category"):
-        context_notes.append(f"Last discussed category: {last_context['last_category']}")
-    if last_context.get("last_metric"):
-        context_notes.append(f"Last metric: {last_context['last_metric']}")
-    if last_context.get("last_column"):
-        context_notes.append(f"Last column: {last_context['last_column']}")
-    if last_context.get("last_group_by"):
-        context_notes.append(f"Last group_by: {last_context['last_group_by']}")
+    # Cheapest path first: keyword rules need neither the LLM nor the caches
+    plan = _route_by_rules(user_message)
+    if plan:
+        return plan
+
+    history = conversation_history or []
 
+    # Exact repeats (same message, same context) skip embedding work entirely
+    plan_key = intent_cache.exact_key(user_message, intent_cache.context_key(last_context, history))
+    cached_plan = intent_cache.get_exact(plan_key) or await intent_cache.get_shared(plan_key)
+    if cached_plan:
+        return cached_plan
+
+    # Semantic matches are only shared between standalone questions; follow-ups
+    # depend on their own session context and must not leak into other sessions.
+    use_cache = not has_context(last_context)
+    if use_cache:
+        try:
+            cached_plan = await asyncio.to_thread(intent_cache.lookup, user_message)
+            if cached_plan:
+                return cached_plan
+            # Clear-cut standalone questions are routed by embedding similarity
+            plan = await asyncio.to_thread(_route_by_anchor, user_message)
+            if plan:
+                return plan
+        except Exception:
+            pass  # Cache and anchors are best-effort; fall through to the LLM
+
+    # Build context hint (standalone questions have none, which keeps their
+    # messages byte-identical across sessions for provider-side caching)
     context_hint = ""
-    if context_notes:
-        context_hint = "\n[CONVERSATION CONTEXT: " + ", ".join(context_notes) + "]"
+    if not use_cache:
+        context_hint = "[CONVERSATION CONTEXT: " + ", ".join(
+            f"{label}: {last_context[key]}" for key, label in _CTX_KEYS if last_context.get(key)
+        ) + "]"
 
+    # Static system prompt first so providers can cache the prefix; the per-session
+    # context goes last as its own message to keep the user's text byte-identical.
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    # Include last 4 turns of history for follow-up resolution
-    for turn in (conversation_history or [])[-4:]:
-        messages.append(turn)
-    messages.append({"role": "user", "content": user_message + context_hint})
-
-    try:
-        content = await call_llm(messages)
-        # Strip markdown code fences if present
-        content = re.sub(r"^```(?:json)?\s*", "", content)
-        content = re.sub(r"\s*```$", "", content)
-
-        plan = json.loads(content)
-        return plan
+    # Recent turns (already bounded by the context manager) for follow-up resolution
+    messages.extend(history)
+    messages.append({"role": "user", "content": user_message})
+    if context_hint:
+        messages.append({"role": "user", "content": context_hint})
+
+    last_error = None
+    for max_tokens in (PLAN_MAX_TOKENS, PLAN_RETRY_MAX_TOKENS):
+        try:
+            content = await classify_batched(
+                messages, max_tokens=max_tokens, response_format=PLAN_RESPONSE_FORMAT, json_object=True
+            )
+            plan = orjson.loads(content)
+            intent_cache.put_exact(plan_key, plan)
+            intent_cache.put_shared(plan_key, plan)  # background write
+            if use_cache and not plan.get("needs_clarification"):
+                try:
+                    await asyncio.to_thread(intent_cache.store, user_message, plan)
+                except Exception:
+                    pass
+            return plan
 
-    except Exception as e:
-        last_error = str(e)
+        except orjson.JSONDecodeError as e:
+            # Likely cut off by the token budget — retry with the larger one
+            last_error = str(e)
+        except Exception as e:
+            last_error = str(e)
+            break
 
     # All models failed — graceful fallback
     return {
@@ -1,9 +1,17 @@
+import math
 import os
+import re
+import asyncio
+import string
+import threading
+import faiss
+import numpy as np
 import pandas as pd
 from langchain_community.document_loaders import CSVLoader
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
-import httpx
+
+from app.analytics import engine as analytics_engine
 
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,47 +21,216 @@ INDEX_PATH = os.path.join(BASE_DIR, "ml", "faiss_index")
 # Embeddings model
 EMBEDDINGS_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 
+# Rows kept in memory for the keyword fallback search
+SEARCH_ROWS = 50000
+
+# How a loaded float32 flat index is re-encoded (RAG_INDEX_KIND):
+#   "flat"     — keep the index as saved (default)
+#   "sq8"      — 8-bit scalar-quantised codes: 4x less memory traffic per scan for a
+#                small recall cost
+#   "ivfpq_fs" — IVF-PQ FastScan (4-bit PQ codes scored with SIMD lookup tables); only
+#                used from IVF_MIN_VECTORS up, below that it falls back to sq8
+# A re-encoded index is written next to the flat one and reused until that changes.
+INDEX_KIND = os.getenv("RAG_INDEX_KIND", "flat")
+IVF_MIN_VECTORS = 100_000
+IVF_NPROBE = 16
+
+
+def _compress_index(index):
+    """Return a compressed copy of a flat FAISS index (same vector order, same metric)."""
+    if INDEX_KIND == "flat" or not isinstance(index, faiss.IndexFlat) or index.ntotal == 0:
+        return index
+    n, d = index.ntotal, index.d
+    vectors = index.reconstruct_n(0, n)
+
+    if INDEX_KIND == "ivfpq_fs" and n >= IVF_MIN_VECTORS and d % 2 == 0:
+        nlist = int(4 * math.sqrt(n))
+        quantizer = faiss.IndexFlat(d, index.metric_type)
+        # Two dimensions per 4-bit sub-quantiser
+        ivf = faiss.IndexIVFPQFastScan(quantizer, d, nlist, d // 2, 4, index.metric_type)
+        ivf.train(vectors[:: max(1, n // (nlist * 64))])  # ~64 training points per list
+        ivf.add(vectors)
+        ivf.nprobe = IVF_NPROBE
+        return ivf
+
+    sq = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, index.metric_type)
+    sq.train(vectors)
+    sq.add(vectors)
+    return sq
+
+
+def _load_compressed(index):
+    """Return the compressed form of a loaded flat index, from disk when it is current."""
+    if INDEX_KIND == "flat" or not isinstance(index, faiss.IndexFlat):
+        return index
+    source = os.path.join(INDEX_PATH, "index.faiss")
+    cached = os.path.join(INDEX_PATH, f"index.{INDEX_KIND}.faiss")
+    try:
+        if os.path.getmtime(cached) >= os.path.getmtime(source):
+            compressed = faiss.read_index(cached)
+            if compressed.ntotal == index.ntotal and compressed.d == index.d:
+                if hasattr(compressed, "nprobe"):
+                    compressed.nprobe = IVF_NPROBE
+                return compressed
+    except (OSError, RuntimeError):
+        pass  # Missing or unreadable; re-encode below
+
+    compressed = _compress_index(index)
+    try:
+        tmp = cached + ".tmp"
+        faiss.write_index(compressed, tmp)
+        os.replace(tmp, cached)
+    except (OSError, RuntimeError) as e:
+        print(f"[WARNING] Could not save {INDEX_KIND} index: {e}.")
+    return compressed
+
+
+def _advise_willneed(path: str):
+    """Ask the OS to start reading the index files into the page cache (POSIX only)."""
+    if not hasattr(os, "posix_fadvise") or not os.path.isdir(path):
+        return
+    for name in os.listdir(path):
+        try:
+            fd = os.open(os.path.join(path, name), os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
 class RAGEngine:
     def __init__(self):
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL)
-        self.vector_store = None
-        self._initialize_vector_store()
+        # Embeddings and the vector index are loaded on first use (see below), so
+        # processes that never reach the RAG path don't pay for the MiniLM model.
+        # Loading blocks for seconds; async callers go through preload() in a thread.
+        self._load_lock = threading.RLock()
+        self._embeddings = None
+        self._vector_store = None
+        self._store_loaded = False  # the index may legitimately load as None
+        # Keyword-search data, built once on the first keyword search
+        self._df = None
+        self._haystack = None  # one lowercased text line per row
+        self._search_loaded = False
+
+    @property
+    def embeddings(self) -> HuggingFaceEmbeddings:
+        if self._embeddings is None:
+            with self._load_lock:
+                if self._embeddings is None:
+                    self._embeddings = HuggingFaceEmbeddings(model_name=EMBEDDINGS_MODEL)
+        return self._embeddings
 
-    def _initialize_vector_store(self):
-        # We try to load the local index, but we NEVER build it on startup
+    @property
+    def vector_store(self):
+        if not self._store_loaded:
+            with self._load_lock:
+                if not self._store_loaded:
+                    self._vector_store = self._load_vector_store()
+                    self._store_loaded = True
+        return self._vector_store
+
+    def _load_vector_store(self):
+        # We try to load the local index, but we NEVER build it
         # because it blocks the server for 20+ minutes.
         if os.path.exists(INDEX_PATH):
             print("[DATABASE] Loading existing RAG index...")
             try:
-                self.vector_store = FAISS.load_local(INDEX_PATH, self.embeddings, allow_dangerous_deserialization=True)
+                store = FAISS.load_local(INDEX_PATH, self.embeddings, allow_dangerous_deserialization=True)
+                # Positions are preserved, so the docstore id mapping still lines up
+                store.index = _load_compressed(store.index)
                 print("[SUCCESS] RAG index loaded.")
+                return store
             except Exception as e:
                 print(f"[WARNING] Could not load index: {e}.")
         else:
             print("[INFO] Vector index missing. Using Instant Pandas-Retrieval Engine instead.")
+        return None
+
+    def preload(self) -> bool:
+        """Load the vector index (and with it the embeddings model) now rather than on
+        the first query. Returns whether vector search is available."""
+        if not self._store_loaded:
+            _advise_willneed(INDEX_PATH)
+        return self.vector_store is not None
+
+    def _search_data(self):
+        if not self._search_loaded:
+            with self._load_lock:
+                if not self._search_loaded:
+                    self._load_search_data()
+                    self._search_loaded = True
+        return self._df, self._haystack
+
+    def _load_search_data(self):
+        if not os.path.exists(CSV_PATH):
+            return
+        try:
+            # Sliced from the frame the analytics engine already holds, copied so the
+            # slice keeps no reference to the full buffers
+            self._df = analytics_engine.get_df().head(SEARCH_ROWS).copy()
+            # All columns joined per row, so a query is a single pass over one column
+            columns = [self._df[col].astype(str) for col in self._df.columns]
+            haystack = columns[0]
+            for col in columns[1:]:
+                haystack = haystack + " " + col
+            self._haystack = haystack.str.lower()
+        except Exception as e:
+            print(f"[WARNING] Could not load search data: {e}")
+            self._df = None
 
     def _fast_pandas_search(self, query: str, k: int = 15) -> str:
         """Instant keyword search on the dataframe without vector embeddings."""
-        if not os.path.exists(CSV_PATH):
+        df, haystack = self._search_data()
+        if df is None:
             return "Dataset missing."
-        
+
         try:
-            df = pd.read_csv(CSV_PATH, nrows=50000) # Fast load first 50k
-            # Simple keyword matching across all string columns
-            query_terms = query.lower().split()
-            
-            # Create a combined text column for searching
-            mask = df.astype(str).apply(lambda x: x.str.contains('|'.join(query_terms), case=False, na=False)).any(axis=1)
+            # Simple keyword matching across all columns
+            query_terms = [t.strip(string.punctuation) for t in query.lower().split()]
+            query_terms = [t for t in query_terms if t]
+            if not query_terms:
+                return df.head(k).to_string()
+
+            # One alternation of the literal terms, matched in a single scan
+            pattern = "|".join(re.escape(t) for t in dict.fromkeys(query_terms))
+            mask = haystack.str.contains(pattern, regex=True).to_numpy(dtype=bool)
             results = df[mask].head(k)
-            
+
             if results.empty:
                 return "No specific matches found. Here are some sample transactions for context:\n" + df.head(5).to_string()
-            
+
             return results.to_string()
         except Exception as e:
             return f"Error in instant search: {e}"
 
+    def _vector_search_batch(self, queries: list[str], k: int) -> list[tuple[str, list]]:
+        store = self.vector_store
+        # One batched encode and one batched index search for all queries
+        vectors = np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+        if getattr(store, "_normalize_L2", False):
+            faiss.normalize_L2(vectors)
+        _, ids = store.index.search(vectors, k)
+        results = []
+        for row in ids:
+            docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in row if i != -1]
+            results.append(("\n\n".join(doc.page_content for doc in docs), docs))
+        return results
+
+    async def query_batch(self, queries: list[str], k: int = 5) -> list[tuple[str, list]]:
+        """
+        Batched form of query(): one (context, docs) pair per query, in order.
+        """
+        if await asyncio.to_thread(self.preload):
+            try:
+                return await asyncio.to_thread(self._vector_search_batch, queries, k)
+            except Exception:
+                pass  # Fallback to pandas
+
+        contexts = await asyncio.gather(*(asyncio.to_thread(self._fast_pandas_search, q) for q in queries))
+        return [(context, []) for context in contexts]
+
     def get_retriever(self):
         if not self.vector_store:
             return None
@@ -63,18 +240,20 @@ class RAGEngine:
         """
         Retrieves context using Vector Search (if available) or Instant Pandas Search.
         """
-        if self.vector_store:
+        # First use loads the model and index; both that and the search block
+        if await asyncio.to_thread(self.preload):
             try:
                 retriever = self.get_retriever()
                 if retriever:
-                    docs = retriever.invoke(user_query)
+                    docs = await asyncio.to_thread(retriever.invoke, user_query)
                     context = "\n\n".join([doc.page_content for doc in docs])
                     return context, docs
             except:
                 pass # Fallback to pandas
         
         print("[SEARCH] Using Pandas Instant-Retrieval...")
-        context = self._fast_pandas_search(user_query)
+        # The scan is CPU-bound; keep it off the event loop
+        context = await asyncio.to_thread(self._fast_pandas_search, user_query)
         # Create a dummy list for compatibility
         return context, []
 
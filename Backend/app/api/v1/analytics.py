@@ -3,13 +3,36 @@ Analytics summary endpoint — returns live KPI cards from the real UPI CSV.
 GET /api/v1/analytics/summary
 """
 
+import asyncio
+from functools import wraps
+
+from cachetools import TTLCache
 from fastapi import APIRouter
 from app.analytics import engine as analytics_engine
 
 router = APIRouter(prefix="/api/v1/analytics", tags=["analytics"])
 
+# The dataset is static for the life of the process, so dashboard polling
+# can be served from memory; the TTL just bounds staleness after a reload.
+RESPONSE_TTL_S = 60
+_responses: TTLCache = TTLCache(maxsize=64, ttl=RESPONSE_TTL_S)
+
+
+def _cached(handler):
+    """Serve a handler's response from the TTL cache, keyed by handler name."""
+    @wraps(handler)
+    async def wrapper():
+        key = handler.__name__
+        if key in _responses:
+            return _responses[key]
+        response = await handler()
+        _responses[key] = response
+        return response
+    return wrapper
+
 
 @router.get("/summary")
+@_cached
 async def get_analytics_summary():
     """
     Returns overall KPI statistics computed from the UPI transactions dataset.
@@ -23,10 +46,14 @@ async def get_analytics_summary():
 
 
 @router.get("/categories")
+@_cached
 async def get_category_breakdown():
     """Returns average amount and fraud rate per merchant category."""
-    result = analytics_engine.query_comparison("merchant_category", "avg", "amount", {})
-    fraud_result = analytics_engine.query_segmentation("merchant_category", "rate", "fraud_flag")
+    # Independent scans over the same DataFrame — run them side by side
+    result, fraud_result = await asyncio.gather(
+        asyncio.to_thread(analytics_engine.query_comparison, "merchant_category", "avg", "amount", {}),
+        asyncio.to_thread(analytics_engine.query_segmentation, "merchant_category", "rate", "fraud_flag"),
+    )
     return {
         "success": True,
         "avg_amount_by_category": result.get("results", []),
@@ -35,10 +62,13 @@ async def get_category_breakdown():
 
 
 @router.get("/devices")
+@_cached
 async def get_device_breakdown():
     """Returns comparison of transaction metrics across device types."""
-    amount_result = analytics_engine.query_comparison("device_type", "avg", "amount", {})
-    fraud_result = analytics_engine.query_comparison("device_type", "rate", "fraud_flag", {})
+    amount_result, fraud_result = await asyncio.gather(
+        asyncio.to_thread(analytics_engine.query_comparison, "device_type", "avg", "amount", {}),
+        asyncio.to_thread(analytics_engine.query_comparison, "device_type", "rate", "fraud_flag", {}),
+    )
     return {
         "success": True,
         "avg_amount_by_device": amount_result.get("results", []),
@@ -47,6 +77,7 @@ async def get_device_breakdown():
 
 
 @router.get("/peak-hours")
+@_cached
 async def get_peak_hours():
     """Returns peak hour distribution across all transactions."""
     result = analytics_engine.query_temporal({})
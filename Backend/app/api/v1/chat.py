@@ -3,37 +3,69 @@ Chat API endpoint — the main conversational analytics interface.
 POST /api/v1/chat
 """
 
+import asyncio
+import hashlib
+import re
 import uuid
+from cachetools import TTLCache
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, NamedTuple, Optional
 
-import json
+import orjson
 try:
     import numpy as np
 except ImportError:
     np = None
 
-from datetime import datetime, timedelta
+import time
+from functools import lru_cache, partial
 from app.analytics import engine as analytics_engine
 from app.analytics import context_manager
 from app.analytics import intent_classifier
 from app.analytics import explainability
 from app.analytics.rag_engine import rag_engine
 
-try:
-    from sklearn.linear_model import LinearRegression
-except ImportError:
-    LinearRegression = None
+from app.core.jit import njit
 
 # Redis is optional — if unavailable the cache is simply skipped
 try:
-    from app.core.redis_client import redis_client
+    from app.core.redis_client import async_redis_client
 except Exception:
-    redis_client = None
+    async_redis_client = None
 
 router = APIRouter(prefix="/api/v1", tags=["chat"])
 
+# -- Response cache -----------------------------------------------------------------
+# Keys are "cache:chat:<blake2b-128 of the normalised message>", values the
+# orjson-encoded ChatResponse. Both tiers keep an entry for CHAT_CACHE_TTL_S; the
+# in-process tier answers repeats without a Redis round trip, Redis shares them
+# across workers.
+
+CHAT_CACHE_TTL_S = 3600
+_local_cache: TTLCache = TTLCache(maxsize=4096, ttl=CHAT_CACHE_TTL_S)
+
+
+def _chat_cache_key(message: str) -> str:
+    # Case and whitespace runs don't change the answer, so they don't split the cache
+    norm = " ".join(message.lower().split())
+    digest = hashlib.blake2b(norm.encode(), digest_size=16).hexdigest()
+    return f"cache:chat:{digest}"
+
+
+def _local_cache_get(cache_key: str) -> Optional[bytes]:
+    return _local_cache.get(cache_key)
+
+
+def _local_cache_set(cache_key: str, payload: bytes):
+    _local_cache[cache_key] = payload
+
+
+# cache_key -> answer being computed for a standalone message, so concurrent
+# duplicates share one computation
+_inflight: dict[str, asyncio.Task] = {}
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -58,6 +90,29 @@ class ChatResponse(BaseModel):
     multi_charts: Optional[list[dict]] = None
 
 
+# ChatResponse field defaults. Response bodies are built as plain dicts on top of
+# these and encoded directly, instead of validating and dumping a model per request.
+_RESPONSE_DEFAULTS = {name: field.default for name, field in ChatResponse.model_fields.items()}
+# Analytics results can carry numpy scalars/arrays (e.g. summary stats); same options
+# FastAPI's ORJSONResponse uses
+_ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Greetings, thanks and bare "help" get a canned reply without touching the LLM or the session
+_SMALL_TALK = re.compile(
+    r"^(?:hi|hello|hey|hiya|yo|good (?:morning|afternoon|evening)|thanks|thank you|thx|help|\?)[\s!.?]*$",
+    re.IGNORECASE,
+)
+_SMALL_TALK_REPLY = (
+    "Hi! Ask me about the UPI transactions data — for example average amounts by category, "
+    "fraud rates by state, peak transaction hours, or a comparison across devices."
+)
+_SMALL_TALK_SUGGESTIONS = [
+    "What is the average transaction amount?",
+    "Show fraud rate by state",
+    "When are the peak transaction hours?",
+]
+
+
 class BusinessAdvisorRequest(BaseModel):
     query: str
 
@@ -69,7 +124,7 @@ class BusinessAdvisorResponse(BaseModel):
 @router.get("/benchmark")
 async def get_benchmark():
     try:
-        data = analytics_engine.get_benchmark_comparison()
+        data = await asyncio.to_thread(analytics_engine.get_benchmark_comparison)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -89,14 +144,15 @@ async def get_history(session_id: str):
     Retrieve the conversation history for a given session.
     Used for the 'History' clock icon in the frontend.
     """
-    history = context_manager.get_conversation_history(session_id)
+    # Blocking Redis read (and a disk save for a new session) — off the loop
+    history = await asyncio.to_thread(context_manager.get_conversation_history, session_id)
     return {"history": history}
 
 
 @router.delete("/history/{session_id}/{index}")
 async def delete_item(session_id: str, index: int):
     """Delete a specific turn from history."""
-    context_manager.delete_history_item(session_id, index)
+    await asyncio.to_thread(context_manager.delete_history_item, session_id, index)
     return {"status": "ok"}
 
 
@@ -107,26 +163,9 @@ async def get_heatmap_risk():
     if "state" not in df.columns or "hour_of_day" not in df.columns or "fraud_flag" not in df.columns:
         return {"error": "Missing required columns for heatmap"}
 
-    def get_slot(h):
-        if 5 <= h < 12: return "Morning"
-        if 12 <= h < 17: return "Afternoon"
-        if 17 <= h < 21: return "Evening"
-        return "Night"
-
-    df["time_slot"] = df["hour_of_day"].apply(get_slot)
-    
-    # Group by state and time_slot
-    hm = df.groupby(["state", "time_slot"])["fraud_flag"].mean().unstack(fill_value=0)
-    data = []
-    available_states = hm.index.tolist()
-    slots = ["Morning", "Afternoon", "Evening", "Night"]
-    
-    for state in available_states[:15]: # Limit to top 15 for UI
-        for slot in slots:
-            rate = float(hm.loc[state, slot] * 100) if slot in hm.columns else 0.0
-            data.append({"state": state, "time": slot, "value": round(rate, 2)})  # type: ignore
-            
-    return {"data": data}
+    # Memoised in the engine; only the first call after a load does the groupby
+    # Columnar {"states", "slots", "values"} rather than one dict per cell
+    return await asyncio.to_thread(analytics_engine.get_heatmap_risk)
 
 
 class SimulateRequest(BaseModel):
@@ -134,39 +173,105 @@ class SimulateRequest(BaseModel):
     percentage: float
 
 
+# action -> (per-unit effect scaled by the percentage, fixed effect), each as
+# (fraud, revenue, operational cost, user impact)
+_SIMULATION_EFFECTS = {
+    "Reduce Transaction Limit": ((-40.0, -20.0, 0.0, 15.0), (0.0, 0.0, 0.0, 0.0)),
+    "Increase Fraud Monitoring": ((-60.0, 0.0, 30.0, 5.0), (0.0, 0.0, 0.0, 0.0)),
+    "Block Risky Device Type": ((0.0, 0.0, 0.0, 0.0), (-15.0, -2.0, 0.0, 5.0)),
+    "Enable Extra Verification": ((0.0, 0.0, 0.0, 0.0), (-25.0, 0.0, 5.0, 10.0)),
+}
+_NO_EFFECT = ((0.0, 0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 0.0))
+
+
 @router.post("/simulate-action")
 async def simulate_action(req: SimulateRequest):
     """Simulate impact of executive actions (5. Simulator)."""
-    atype = req.action_type
     p = req.percentage / 100.0  # Normalized %
-    
-    f_change, r_change, c_change, u_impact = 0, 0, 0, 0
-    
-    if atype == "Reduce Transaction Limit":
-        f_change = -p * 40
-        r_change = -p * 20
-        u_impact = p * 15
-    elif atype == "Increase Fraud Monitoring":
-        f_change = -p * 60
-        c_change = p * 30
-        u_impact = p * 5
-    elif atype == "Block Risky Device Type":
-        f_change = -15
-        u_impact = 5
-        r_change = -2
-    elif atype == "Enable Extra Verification":
-        f_change = -25
-        u_impact = 10
-        c_change = 5
+    scaled, fixed = _SIMULATION_EFFECTS.get(req.action_type, _NO_EFFECT)
+    f_change, r_change, c_change, u_impact = (p * k + c for k, c in zip(scaled, fixed))
 
     return {
-        "fraud_change": round(float(f_change), 1),  # type: ignore
-        "revenue_change": round(float(r_change), 1),  # type: ignore
-        "operational_cost_change": round(float(c_change), 1),  # type: ignore
-        "user_impact_score": round(float(u_impact), 1)  # type: ignore
+        "fraud_change": round(f_change, 1),
+        "revenue_change": round(r_change, 1),
+        "operational_cost_change": round(c_change, 1),
+        "user_impact_score": round(u_impact, 1)
     }
 
 
+# -- Intent dispatch ----------------------------------------------------------------
+
+# Chart types that imply their own query when several charts are requested
+_CHART_INTENTS = {
+    "histogram": "distribution",
+    "scatter": "correlation",
+    "area": "temporal",
+    "line": "temporal",
+    "pie": "segmentation",
+    "donut": "segmentation",
+    "stacked_bar": "multi_segmentation",
+    "grouped_bar": "multi_segmentation",
+}
+
+# intent -> analytics query over the QueryPlan
+_QUERIES = {
+    "aggregation": lambda p: analytics_engine.query_aggregation(
+        p.get("metric", "avg"), p.get("column", "amount"), p.get("filters") or {}),
+    "comparison": lambda p: analytics_engine.query_comparison(
+        p.get("group_by") or "device_type", p.get("metric", "avg"), p.get("column", "amount"), p.get("filters") or {}),
+    "temporal": lambda p: analytics_engine.query_temporal(p.get("filters") or {}),
+    "segmentation": lambda p: analytics_engine.query_segmentation(
+        p.get("segment_col") or p.get("group_by") or "merchant_category", p.get("metric", "avg"), p.get("column", "amount")),
+    "risk": lambda p: analytics_engine.query_risk(p.get("segment_col") or p.get("group_by")),
+    "distribution": lambda p: analytics_engine.query_histogram(p.get("column", "amount")),
+    "correlation": lambda p: analytics_engine.query_correlation(
+        p.get("column", "amount"), p.get("secondary_segment") or "hour_of_day"),
+    "multi_segmentation": lambda p: analytics_engine.query_multi_segmentation(
+        p.get("segment_col") or "state", p.get("secondary_segment") or "device_type", p.get("metric", "avg"), p.get("column", "amount")),
+    "dashboard": lambda p: analytics_engine.generate_dashboard_data(
+        p.get("metric", "avg"), p.get("column", "amount"), p.get("filters") or {}),
+}
+
+# Answer handlers: (plan, message, primary_result) -> (primary_result, answer)
+
+def _formatted(formatter):
+    """Handler for intents whose answer is a template over the query result."""
+    async def handler(plan: dict, message: str, result: dict) -> tuple[dict, str]:
+        return result, formatter(plan, result)
+    return handler
+
+
+async def _answer_dashboard(plan: dict, message: str, result: dict) -> tuple[dict, str]:
+    if "error" in result:
+        return result, result["error"]
+    return result, await explainability.generate_dashboard_narrative(message, result)
+
+
+async def _answer_rag(plan: dict, message: str, result: dict) -> tuple[dict, str]:
+    context, docs = await rag_engine.query(message)
+    answer = await explainability.generate_rag_response(message, context)
+    return {"context": context, "sources": [doc.metadata.get("source") for doc in docs]}, answer
+
+
+async def _answer_summary(plan: dict, message: str, result: dict) -> tuple[dict, str]:
+    stats = await asyncio.to_thread(analytics_engine.get_summary_stats)
+    return stats, _summary_answer(analytics_engine.get_data_version())
+
+
+_ANSWER_HANDLERS = {
+    "aggregation": _formatted(explainability.format_aggregation_response),
+    "comparison": _formatted(explainability.format_comparison_response),
+    "temporal": _formatted(explainability.format_temporal_response),
+    "segmentation": _formatted(explainability.format_segmentation_response),
+    "risk": _formatted(explainability.format_risk_response),
+    "distribution": _formatted(explainability.format_distribution_response),
+    "correlation": _formatted(explainability.format_correlation_response),
+    "multi_segmentation": _formatted(explainability.format_multi_segmentation_response),
+    "dashboard": _answer_dashboard,
+    "rag": _answer_rag,
+}
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -177,24 +282,115 @@ async def chat(request: ChatRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
 
+    # An id handed out here is created on first use by get_or_create_session
+    session_id = request.session_id or str(uuid.uuid4())
+
+    if _SMALL_TALK.match(request.message.strip()):
+        return ORJSONResponse({
+            **_RESPONSE_DEFAULTS,
+            "answer": _SMALL_TALK_REPLY,
+            "session_id": session_id,
+            "intent": "greeting",
+            "suggestions": _SMALL_TALK_SUGGESTIONS,
+        })
+
+    # --- CACHE CHECK (local, then Redis) ---
+    cache_key = _chat_cache_key(request.message)
+    cached_res = _local_cache_get(cache_key)
+    from_redis = False
+    # A returning session's context is read in the same round trip as the cached
+    # response, so it doesn't need a second Redis call to load it
+    stored_session = context_manager.NOT_FETCHED
+    if cached_res is None and async_redis_client is not None:
+        try:
+            if request.session_id:
+                cached_res, stored_session = await async_redis_client.mget(
+                    cache_key, context_manager.session_key(session_id)
+                )
+            else:
+                cached_res = await async_redis_client.get(cache_key)
+            from_redis = cached_res is not None
+        except Exception:
+            pass
+
     # 1. Get or create session context
-    session_id, ctx = context_manager.get_or_create_session(request.session_id)
-    
-    # --- REDIS CACHE CHECK ---
-    cache_key = f"cache:{request.message.strip().lower()}"
-    try:
-        if redis_client is not None:
-            cached_res = redis_client.get(cache_key)
-            if cached_res:
-                cached_data = json.loads(cached_res)
-                cached_data["session_id"] = session_id
-                return ChatResponse(**cached_data)  # type: ignore
-    except Exception:
-        pass
+    # Session load/save hit the blocking Redis client and the disk store — keep them off the loop
+    session_id, ctx = await asyncio.to_thread(context_manager.get_or_create_session, session_id, stored_session)
+
+    # Cached answers are keyed on the message alone, so only standalone questions use
+    # them; a follow-up ("what about iOS?") depends on this session's own context
+    standalone = not intent_classifier.has_context(ctx)
+    if standalone and cached_res:
+        try:
+            cached_data = orjson.loads(cached_res)
+        except Exception:
+            cached_data = None
+        if cached_data:
+            if from_redis:
+                _local_cache_set(cache_key, cached_res)
+            plan = cached_data.pop("query_plan", None) or {}
+            body = {**cached_data, "session_id": session_id}  # already a ChatResponse-shaped body
+            await _record_turn(session_id, ctx, plan, request.message, body)
+            return ORJSONResponse(body)
     # -------------------------
 
-    conversation_history = context_manager.get_conversation_history(session_id)
-    last_ctx = context_manager.get_last_context(session_id)
+    if not standalone:
+        _, payload, _ = await _answer(request, session_id, ctx, None)
+        return Response(content=payload, media_type="application/json")
+
+    # Same standalone message already being answered for another request — share
+    # that result, and record it as this session's turn
+    inflight = _inflight.get(cache_key)
+    if inflight is not None:
+        owner_body, _, plan = await asyncio.shield(inflight)
+        body = {**_shareable(owner_body), "session_id": session_id}
+        await _record_turn(session_id, ctx, plan, request.message, body)
+        return ORJSONResponse(body)
+
+    # The answer runs as its own task, so a client disconnecting cancels only its own
+    # wait — the computation, and every request coalesced onto it, still completes
+    task = asyncio.create_task(_answer(request, session_id, ctx, cache_key))
+    _inflight[cache_key] = task
+    task.add_done_callback(partial(_inflight_done, cache_key))
+    _, payload, _ = await asyncio.shield(task)
+    # Encoded once in _answer; FastAPI passes a Response through untouched
+    return Response(content=payload, media_type="application/json")
+
+
+async def _record_turn(session_id: str, ctx: dict, plan: dict, message: str, body: dict):
+    """Add an answer computed for another request to this session's history."""
+    await asyncio.to_thread(
+        context_manager.update_context, session_id, plan, message, body.get("answer"), body, ctx=ctx
+    )
+
+
+def _inflight_done(cache_key: str, task: asyncio.Task):
+    if _inflight.get(cache_key) is task:
+        del _inflight[cache_key]
+    if not task.cancelled():
+        task.exception()  # mark retrieved in case nobody was left waiting
+
+
+# Insights computed from the requesting session's own history; other sessions that
+# receive the answer (coalesced or from the response cache) get them cleared
+_SESSION_FIELDS = ("pattern_alert", "comparison_insight")
+
+
+def _shareable(body: dict) -> dict:
+    return {**body, **dict.fromkeys(_SESSION_FIELDS)}
+
+
+async def _answer(
+    request: ChatRequest, session_id: str, ctx: dict, cache_key: Optional[str]
+) -> tuple[dict, bytes, dict]:
+    """Classify, query and explain one chat message (cache misses only).
+
+    `ctx` is the session context resolved once by the caller; every step below
+    reads and updates it directly. Answers are cached under `cache_key` unless it is
+    None. Returns the ChatResponse as a JSON-ready dict, its encoded bytes and the
+    query plan.
+    """
+    conversation_history = context_manager.get_prompt_history(session_id, ctx)
 
     # Defaults for chart title construction
     metric = "count"
@@ -206,7 +402,7 @@ async def chat(request: ChatRequest):
     plan = await intent_classifier.classify_intent(
         user_message=request.message,
         conversation_history=conversation_history,
-        last_context=last_ctx,
+        last_context=ctx,
     )
 
     intent = plan.get("intent", "ambiguous")
@@ -216,14 +412,16 @@ async def chat(request: ChatRequest):
     if needs_clarification:
         clarification_q = plan.get("clarification_question", "Could you be more specific?")
         answer = explainability.format_clarification_response(clarification_q)
-        context_manager.update_context(session_id, plan, request.message, answer)
-        return ChatResponse(  # type: ignore
-            answer=answer,
-            session_id=session_id,
-            intent=intent,
-            needs_clarification=True,
-            clarification_question=clarification_q,
-        )
+        await asyncio.to_thread(context_manager.update_context, session_id, plan, request.message, answer, ctx=ctx)
+        body = {
+            **_RESPONSE_DEFAULTS,
+            "answer": answer,
+            "session_id": session_id,
+            "intent": intent,
+            "needs_clarification": True,
+            "clarification_question": clarification_q,
+        }
+        return body, orjson.dumps(body, option=_ORJSON_OPTS), plan
 
     # 4. Route to the correct analytics function
     # 4. Route to the correct analytics function
@@ -233,41 +431,16 @@ async def chat(request: ChatRequest):
     primary_result = None
 
     async def get_result_for_type(ctype):
-        filters = plan.get("filters", {}) or {}
         column = plan.get("column", "amount")
         metric = plan.get("metric", "avg")
-        group_by = plan.get("group_by")
-        segment_col = plan.get("segment_col")
-        
-        raw_res = {}
+
         # Map chart type back to intent if we are doing multi-chart
         # This is a bit of a heuristic to allow "show bar and line"
-        local_intent = intent
-        if ctype == "histogram": local_intent = "distribution"
-        elif ctype == "scatter": local_intent = "correlation"
-        elif ctype == "area" or ctype == "line": local_intent = "temporal"
-        elif ctype == "pie" or ctype == "donut": local_intent = "segmentation"
-        elif ctype == "stacked_bar" or ctype == "grouped_bar": local_intent = "multi_segmentation"
-
-        if local_intent == "aggregation":
-            raw_res = analytics_engine.query_aggregation(metric, column, filters)
-        elif local_intent == "comparison":
-            raw_res = analytics_engine.query_comparison(group_by or "device_type", metric, column, filters)
-        elif local_intent == "temporal":
-            raw_res = analytics_engine.query_temporal(filters)
-        elif local_intent == "segmentation":
-            raw_res = analytics_engine.query_segmentation(segment_col or group_by or "merchant_category", metric, column)
-        elif local_intent == "risk":
-            raw_res = analytics_engine.query_risk(segment_col or group_by)
-        elif local_intent == "distribution":
-            raw_res = analytics_engine.query_histogram(column)
-        elif local_intent == "correlation":
-            raw_res = analytics_engine.query_correlation(column, plan.get("secondary_segment") or "hour_of_day")
-        elif local_intent == "multi_segmentation":
-            raw_res = analytics_engine.query_multi_segmentation(plan.get("segment_col") or "state", plan.get("secondary_segment") or "device_type", metric, column)
-        elif local_intent == "dashboard":
-            raw_res = analytics_engine.generate_dashboard_data(metric, column, filters)
-        
+        local_intent = _CHART_INTENTS.get(ctype, intent)
+        query = _QUERIES.get(local_intent)
+        # pandas work runs on the thread pool so the loop keeps serving other requests
+        raw_res = await asyncio.to_thread(query, plan) if query else {}
+
         chart_obj = None
         if raw_res.get("chart_data"):
             chart_obj = {
@@ -279,105 +452,78 @@ async def chat(request: ChatRequest):
         return raw_res, chart_obj
 
     try:
-        # Generate all requested charts
-        for i, cvt in enumerate(requested_charts):
-            res_data, chart_data = await get_result_for_type(cvt)
-            if i == 0:
-                primary_result = res_data
-            if chart_data:
-                multi_charts.append(chart_data)
+        # Generate all requested charts; their queries are independent, so run them together
+        results = await asyncio.gather(*(get_result_for_type(cvt) for cvt in requested_charts))
+        primary_result = results[0][0]
+        multi_charts = [chart_data for _, chart_data in results if chart_data]
         
         # Determine the textual answer using the primary result
-        if intent == "aggregation":
-            answer = explainability.format_aggregation_response(plan, primary_result)
-        elif intent == "comparison":
-            answer = explainability.format_comparison_response(plan, primary_result)
-        elif intent == "temporal":
-            answer = explainability.format_temporal_response(plan, primary_result)
-        elif intent == "segmentation":
-            answer = explainability.format_segmentation_response(plan, primary_result)
-        elif intent == "risk":
-            answer = explainability.format_risk_response(plan, primary_result)
-        elif intent == "distribution":
-            answer = explainability.format_distribution_response(plan, primary_result)
-        elif intent == "correlation":
-            answer = explainability.format_correlation_response(plan, primary_result)
-        elif intent == "multi_segmentation":
-            answer = explainability.format_multi_segmentation_response(plan, primary_result)
-        elif intent == "dashboard":
-            if "error" in primary_result:
-                answer = primary_result["error"]
-            else:
-                answer = await explainability.generate_dashboard_narrative(request.message, primary_result)
-        elif intent == "rag":
-            context, docs = await rag_engine.query(request.message)
-            answer = await explainability.generate_rag_response(request.message, context)
-            primary_result = {"context": context, "sources": [doc.metadata.get("source") for doc in docs]}
-        else:
-            primary_result = analytics_engine.get_summary_stats()
-            answer = _format_summary(primary_result)
+        handler = _ANSWER_HANDLERS.get(intent, _answer_summary)
+        primary_result, answer = await handler(plan, request.message, primary_result)
 
     except Exception as e:
         answer = explainability.format_error_response(str(e))
         primary_result = {"error": str(e)}
 
     # --- PROFESSIONAL FEATURES INTEGRATION ---
-    strategic_impact = None
-    pattern_alert = None
-    comparison_insight = None
-    forecast_insight = None
-    benchmark_insight = None
-
-    if intent != "ambiguous":
-        # Ensure result is a dict to prevent NoneType attribute errors in formatters
-        safe_res = primary_result if isinstance(primary_result, dict) else {}
-        
-        # 1. Strategic Impact Engine
-        strategic_impact = _calculate_strategic_impact(safe_res, intent)
-        # 2. Pattern Memory System
-        pattern_alert = _check_pattern_memory(session_id, intent, plan, safe_res)
-        # 3. Cross-Question Validator
-        comparison_insight = _get_cross_question_comparison(session_id, intent, plan, safe_res)
-        # 4. Risk Forecasting (for temporal queries)
-        if intent == "temporal" or "time" in request.message.lower():
-             forecast_insight = _get_risk_forecast(safe_res)
-        # 9. Competitive Benchmark
-        benchmark_insight = _get_benchmark_insight(intent, safe_res)
-
-    # Persist the current result for future comparisons
-    _store_query_result(session_id, intent, plan, primary_result)
-
-    response = ChatResponse(  # type: ignore
-        answer=answer,
-        session_id=session_id,
-        intent=intent,
-        data=primary_result,
-        chart_data=multi_charts[0] if multi_charts else None,
-        multi_charts=multi_charts if len(multi_charts) > 1 else None,
-        needs_clarification=False,
-        strategic_impact=strategic_impact,
-        pattern_alert=pattern_alert,
-        comparison_insight=comparison_insight,
-        forecast_insight=forecast_insight,
-        benchmark_insight=benchmark_insight,
-        suggestions=explainability.generate_recommendations(plan, primary_result)
-    )
-    # -----------------------------------------
+    insights = _enrich_insights(ctx, intent, plan, primary_result, request.message)
+
+    body = {
+        **_RESPONSE_DEFAULTS,
+        "answer": answer,
+        "session_id": session_id,
+        "intent": intent,
+        "data": primary_result,
+        "chart_data": multi_charts[0] if multi_charts else None,
+        "multi_charts": multi_charts if len(multi_charts) > 1 else None,
+        "needs_clarification": False,
+        **insights,
+        "suggestions": explainability.generate_recommendations(plan, primary_result),
+    }
+    # Encoded once: the same dict goes into the session history and the same bytes
+    # into both cache tiers and the HTTP body
+    payload = orjson.dumps(body, option=_ORJSON_OPTS)
 
     # -----------------------------------------
-    # Update context with the latest turn (including rich response data)
-    context_manager.update_context(session_id, plan, request.message, answer, response.dict())
+    # Update context with the latest turn (including rich response data). With an
+    # async client the session and the response cache go to Redis in one pipeline.
+    use_pipeline = async_redis_client is not None
+    await asyncio.to_thread(
+        context_manager.update_context, session_id, plan, request.message, answer, body,
+        ctx=ctx, save_redis=not use_pipeline,
+    )
     # -----------------------------------------
 
-    # --- REDIS CACHE SET ---
-    try:
-        if redis_client is not None:
-            redis_client.setex(cache_key, 3600, response.model_dump_json())
-    except Exception:
-        pass
+    # --- CACHE SET (local, then Redis) ---
+    cacheable = cache_key is not None and not (isinstance(primary_result, dict) and "error" in primary_result)
+    if cacheable:
+        # The cache answers other sessions too, so it holds the session-independent
+        # body, plus the plan so a hit can record the turn in the asking session
+        shared_payload = orjson.dumps({**_shareable(body), "query_plan": plan}, option=_ORJSON_OPTS)
+        _local_cache_set(cache_key, shared_payload)
+    if use_pipeline:
+        try:
+            pipe = async_redis_client.pipeline(transaction=False)
+            pipe.setex(
+                context_manager.session_key(session_id),
+                context_manager.SESSION_TTL,
+                context_manager.encode_context(ctx),
+            )
+            if cacheable:
+                pipe.setex(cache_key, CHAT_CACHE_TTL_S, shared_payload)
+            await pipe.execute()
+        except Exception as e:
+            # Redis is best-effort, but a failure here means the session isn't shared
+            print(f"[REDIS ERROR] Could not save session/cache for {session_id}: {e}")
     # -----------------------
 
-    return response
+    return body, payload, plan
+
+
+@lru_cache(maxsize=4)
+def _summary_answer(data_version: int) -> str:
+    """Summary answer text; identical for every request against the same dataset."""
+    return _format_summary(analytics_engine.get_summary_stats())
 
 
 def _format_summary(stats: dict) -> str:
@@ -402,10 +548,45 @@ def _format_summary(stats: dict) -> str:
 
 # --- HELPERS FOR ADVANCED FEATURES ---
 
-def _calculate_strategic_impact(res: dict, intent: str) -> dict:
+def _enrich_insights(ctx: dict, intent: str, plan: dict, res: dict, message: str) -> dict:
+    """All professional-feature fields for one answer, keyed by ChatResponse field.
+
+    The result value is read once and handed to each feature; the current result is
+    then stored on `ctx` for the next question's comparison.
+    """
+    insights = {
+        "strategic_impact": None,
+        "pattern_alert": None,
+        "comparison_insight": None,
+        "forecast_insight": None,
+        "benchmark_insight": None,
+    }
+    # Non-dict results carry no value for the formatters
+    val = res.get("result") if isinstance(res, dict) else None
+    metric = plan.get("metric")
+
+    if intent != "ambiguous":
+        # 1. Strategic Impact Engine
+        insights["strategic_impact"] = _calculate_strategic_impact(val, intent)
+        # 2. Pattern Memory System
+        insights["pattern_alert"] = _check_pattern_memory(ctx, metric or "avg", val)
+        # 3. Cross-Question Validator
+        insights["comparison_insight"] = _get_cross_question_comparison(ctx, metric, val)
+        # 4. Risk Forecasting (for temporal queries)
+        if intent == "temporal" or "time" in message.lower():
+            insights["forecast_insight"] = _get_risk_forecast()
+        # 9. Competitive Benchmark
+        insights["benchmark_insight"] = _get_benchmark_insight(intent, val)
+
+    # Persist the current result for future comparisons
+    ctx["last_query_result"] = [metric, val]  # plain list: the context is stored as JSON
+    return insights
+
+
+def _calculate_strategic_impact(val: Any, intent: str) -> dict:
     """Implement Strategic Impact Engine (Feature 1)."""
     # Extract metrics (mocked if not present in localized query)
-    val = res.get("result") or 0
+    val = val or 0
     if intent == "aggregation" and isinstance(val, (int, float)):
         # Example logic
         rev_exp = val * 0.15 # Mock revenue exposure 15% of result volume
@@ -429,51 +610,97 @@ def _calculate_strategic_impact(res: dict, intent: str) -> dict:
     }
 
 
-def _check_pattern_memory(sid: str, intent: str, plan: dict, res: dict) -> dict:
+PATTERN_MEMORY_SIZE = 20  # Values kept per metric type
+
+
+@njit(cache=True, fastmath=True)
+def _count_hits(values, val, tol):
+    """Number of past values within `tol` (relative) of `val`."""
+    scale = val if val != 0 else 1.0
+    hits = 0
+    for v in values:
+        if abs(v - val) / scale < tol:
+            hits += 1
+    return hits
+
+
+if np is not None:
+    _count_hits(np.zeros(1), 1.0, 0.05)  # compile now rather than on the first request
+
+
+def _check_pattern_memory(ctx: dict, mtype: str, val: Any) -> dict:
     """Pattern Memory System (Feature 2)."""
-    _, ctx = context_manager.get_or_create_session(sid)
-    mtype = plan.get("metric", "avg")
-    val = res.get("result") or 0
+    val = val or 0
     
     if not isinstance(val, (int, float)): return None
     
-    log = ctx.get("pattern_log", [])
-    similar_hits = [l for l in log if l["metric_type"] == mtype and abs(l["value"] - val) / (val or 1) < 0.05]
+    # Past values bucketed by metric type, so only comparable entries are scanned.
+    # Each bucket is a fixed-size ring: once full, the oldest slot is overwritten in place.
+    bucket = ctx.setdefault("pattern_index", {}).setdefault(mtype, {"values": [], "timestamps": [], "next": 0})
+    values, stamps = bucket["values"], bucket["timestamps"]
+    if np is not None:
+        similar_hits = _count_hits(np.asarray(values, dtype=np.float64), float(val), 0.05)
+    else:
+        similar_hits = sum(1 for v in values if abs(v - val) / (val or 1) < 0.05)
     
     # Store current
-    log.append({"metric_type": mtype, "value": val, "timestamp": datetime.utcnow().isoformat()})
-    ctx["pattern_log"] = log[-20:] # Keep last 20
+    now = time.time_ns()  # ordering only; format at display time if ever shown
+    if len(values) < PATTERN_MEMORY_SIZE:
+        values.append(val)
+        stamps.append(now)
+    else:
+        i = bucket.get("next", 0)
+        values[i], stamps[i] = val, now
+        bucket["next"] = (i + 1) % PATTERN_MEMORY_SIZE
 
-    if len(similar_hits) >= 2:
-        return {"pattern_flag": True, "occurrences": len(similar_hits)}
+    if similar_hits >= 2:
+        return {"pattern_flag": True, "occurrences": similar_hits}
     return None
 
 
-def _get_cross_question_comparison(sid: str, intent: str, plan: dict, res: dict) -> str:
-    """Cross-Question Validator (Feature 3)."""
-    _, ctx = context_manager.get_or_create_session(sid)
+class QueryResult(NamedTuple):
+    """Previous answer kept for the cross-question validator.
+
+    Read view only: the context stores it as a plain [metric, value] list,
+    which JSON encoders (and the session's persistence) handle directly.
+    """
+    metric: Optional[str]
+    value: Any
+
+
+def _last_query_result(ctx: dict) -> Optional[QueryResult]:
     last = ctx.get("last_query_result")
-    curr_metric = plan.get("metric")
-    curr_val = res.get("result")
-    
-    if last and last["metric"] == curr_metric and isinstance(curr_val, (int, float)) and isinstance(last["value"], (int, float)):
-        ratio = round(curr_val / (last["value"] or 1), 2)  # type: ignore
+    if not last:
+        return None
+    if isinstance(last, dict):  # sessions saved before the tuple format
+        return QueryResult(last.get("metric"), last.get("value"))
+    return QueryResult(*last)
+
+
+def _get_cross_question_comparison(ctx: dict, curr_metric: Optional[str], curr_val: Any) -> str:
+    """Cross-Question Validator (Feature 3)."""
+    last = _last_query_result(ctx)
+
+    if last and last.metric == curr_metric and isinstance(curr_val, (int, float)) and isinstance(last.value, (int, float)):
+        ratio = round(curr_val / (last.value or 1), 2)  # type: ignore
         diff = "higher" if ratio > 1 else "lower"
         return f"Comparison Insight: Current result is {ratio}x {diff} than previous query."
     return None
 
 
-def _store_query_result(sid: str, intent: str, plan: dict, res: dict):
-    _, ctx = context_manager.get_or_create_session(sid)
-    ctx["last_query_result"] = {
-        "metric": plan.get("metric"),
-        "value": res.get("result")
-    }
+@njit(cache=True)
+def _ols7(x, y):
+    """Closed-form least-squares line through (x, y); returns (slope, intercept)."""
+    xm = x.mean()
+    ym = y.mean()
+    s = ((x - xm) * (y - ym)).sum()
+    v = ((x - xm) ** 2).sum()
+    m = s / v
+    return m, ym - m * xm
 
 
-def _get_risk_forecast(res: dict) -> dict:
-    """Risk Forecasting Module (Feature 4)."""
-    if LinearRegression is None or np is None:
+def _fit_forecast() -> dict:
+    if np is None:
         return {
             "projected_value": 2.5,
             "trend_direction": "Stable (Mock)",
@@ -481,12 +708,12 @@ def _get_risk_forecast(res: dict) -> dict:
         }
     
     # Mock time series for regression if not available
-    y = np.array([2.1, 2.3, 2.2, 2.5, 2.4, 2.8, 2.7]).reshape(-1, 1)
-    x = np.array([0, 1, 2, 3, 4, 5, 6]).reshape(-1, 1)
+    y = np.array([2.1, 2.3, 2.2, 2.5, 2.4, 2.8, 2.7])
+    x = np.arange(7.0)
     
-    model = LinearRegression().fit(x, y)
-    proj = model.predict([[7]])[0][0]
-    trend = "Up" if model.coef_[0][0] > 0.05 else "Down" if model.coef_[0][0] < -0.05 else "Stable"
+    slope, intercept = _ols7(x, y)
+    proj = slope * 7 + intercept
+    trend = "Up" if slope > 0.05 else "Down" if slope < -0.05 else "Stable"
     
     return {
         "projected_value": round(float(proj), 2),  # type: ignore
@@ -495,9 +722,17 @@ def _get_risk_forecast(res: dict) -> dict:
     }
 
 
-def _get_benchmark_insight(intent: str, res: dict) -> str:
+# The forecast series is fixed, so the line is fitted once at import
+_FORECAST = _fit_forecast()
+
+
+def _get_risk_forecast() -> dict:
+    """Risk Forecasting Module (Feature 4)."""
+    return dict(_FORECAST)
+
+
+def _get_benchmark_insight(intent: str, val: Any) -> str:
     """Competitive Benchmark Mode (Feature 9)."""
-    val = res.get("result")
     if not isinstance(val, (int, float)) or val == 0: return None
     
     industry_avg = 3.5 if "fraud" in intent else 2150
@@ -1,7 +1,9 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
+import jwt
 import os
+import time
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,10 +12,19 @@ load_dotenv()
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET") # This is usually the same as SUPABASE_SERVICE_KEY for decoding, but check Supabase docs.
 ALGORITHM = "HS256"
 
+# Verified tokens -> (user, exp). Bursts from the same client skip the decode and
+# HMAC check; an entry is never served past the token's own expiry.
+TOKEN_CACHE_TTL_S = 60
+_verified: TTLCache = TTLCache(maxsize=1024, ttl=TOKEN_CACHE_TTL_S)
+
 security = HTTPBearer()
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    cached = _verified.get(token)
+    if cached and (cached[1] is None or cached[1] > time.time()):
+        return dict(cached[0])
+
     try:
         # Note: In a production environment, you should use the Supabase Project JWT Secret
         # to verify the token locally. Alternatively, call supabase.auth.get_user(token).
@@ -24,8 +35,10 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication credentials",
             )
-        return {"id": user_id, "email": payload.get("email")}
-    except JWTError:
+        user = {"id": user_id, "email": payload.get("email")}
+        _verified[token] = (user, payload.get("exp"))
+        return dict(user)
+    except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
@@ -0,0 +1,14 @@
+"""
+Optional Numba JIT for small numeric kernels.
+Without numba installed, `njit` leaves functions untouched, so the same kernels
+run as ordinary NumPy code.
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Supports both @njit and @njit(cache=True, ...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
@@ -1,5 +1,7 @@
 import os
-import httpx
+import asyncio
+import aiohttp
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,32 +13,160 @@ MODELS = [
     "google/gemini-2.0-flash-lite-001",
 ]
 
-async def call_llm(messages: list[dict], temperature: float = 0.1, max_tokens: int = 512) -> str:
-    """Generic helper to call OpenRouter with fallback models."""
-    last_error = None
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        for model in MODELS:
+# Upper bound on concurrent upstream calls, so a burst of chats queues here
+# instead of fanning out into a burst of provider requests
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+_llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Shared session so concurrent calls reuse pooled connections to OpenRouter."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=200, limit_per_host=100, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=30),
+        )
+    return _session
+
+
+async def close_session():
+    """Close the shared session (called on application shutdown)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def warmup() -> bool:
+    """Open a pooled connection to OpenRouter (DNS, TCP and TLS) ahead of the first call.
+
+    Returns whether OpenRouter answered at all; the HEAD status itself is ignored.
+    """
+    try:
+        async with get_session().head(OPENROUTER_BASE_URL, timeout=aiohttp.ClientTimeout(total=5)):
+            return True
+    except Exception:
+        return False
+
+
+class _ObjectScanner:
+    """Finds where the first top-level JSON object ends in streamed text."""
+
+    def __init__(self):
+        self.text = ""
+        self.start = -1
+        self.end = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> bool:
+        """Append a chunk; returns True once the object is closed."""
+        offset = len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = self.start >= 0
+            elif ch == "{":
+                if self.start < 0:
+                    self.start = i
+                self._depth += 1
+            elif ch == "}" and self.start >= 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = i + 1
+                    return True
+        return False
+
+    def result(self) -> str:
+        if self.end > 0:
+            return self.text[self.start:self.end]
+        return self.text  # never closed — let the caller's parser report it
+
+
+# How long to keep reading the trailing SSE frames after the object has closed. A
+# fully read body returns its connection to the pool; giving up closes it instead.
+STREAM_DRAIN_TIMEOUT_S = 2.0
+
+
+async def _read_json_stream(response: aiohttp.ClientResponse) -> str:
+    """Accumulate SSE content deltas until the JSON object closes, then drain the rest."""
+    scanner = _ObjectScanner()
+    async for line in response.content:
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            continue  # blank separators and ": keep-alive" comments
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
+        delta = orjson.loads(data)["choices"][0].get("delta") or {}
+        if scanner.feed(delta.get("content") or ""):
+            # Only a few frames (finish reason, usage, [DONE]) follow the object
             try:
-                response = await client.post(
-                    OPENROUTER_BASE_URL,
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://insightx.astra",
-                        "X-Title": "InsightX UPI Analytics",
-                    },
-                    json={
-                        "model": model,
-                        "messages": messages,
-                        "temperature": temperature,
-                        "max_tokens": max_tokens,
-                    },
-                )
+                async with asyncio.timeout(STREAM_DRAIN_TIMEOUT_S):
+                    async for _ in response.content:
+                        pass
+            except TimeoutError:
+                pass
+            break
+    return scanner.result()
+
+
+async def call_llm(
+    messages: list[dict],
+    temperature: float = 0.1,
+    max_tokens: int = 512,
+    response_format: dict | None = None,
+    json_object: bool = False,
+) -> str:
+    """Generic helper to call OpenRouter with fallback models.
+
+    `response_format` is passed through as-is (e.g. a json_schema spec for
+    structured output). With `json_object=True` the reply is streamed and
+    returned as soon as its top-level JSON object is complete.
+    """
+    last_error = None
+    session = get_session()
+    for model in MODELS:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if response_format is not None:
+            payload["response_format"] = response_format
+        if json_object:
+            payload["stream"] = True
+        try:
+            async with _llm_slots, session.post(
+                OPENROUTER_BASE_URL,
+                headers={
+                    "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "https://insightx.astra",
+                    "X-Title": "InsightX UPI Analytics",
+                },
+                json=payload,
+            ) as response:
                 response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"].strip()
-            except Exception as e:
-                last_error = str(e)
-                continue
-    
+                if json_object and response.content_type == "text/event-stream":
+                    return (await _read_json_stream(response)).strip()
+                # Non-streaming reply (or a provider that ignored `stream`)
+                data = await response.json()
+            return data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            last_error = str(e)
+            continue
+
     raise Exception(f"All LLM models failed. Last error: {last_error}")
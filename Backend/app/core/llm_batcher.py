@@ -0,0 +1,75 @@
+"""
+Micro-batcher for intent classification LLM calls.
+Requests arriving within a few milliseconds of each other are flushed together:
+identical payloads in a batch share one upstream call, and the rest go out
+concurrently over the shared OpenRouter session.
+"""
+
+import asyncio
+import json
+
+from app.core.llm import call_llm
+
+BATCH_WINDOW_S = 0.005
+BATCH_MAX_ITEMS = 8
+
+_queue: asyncio.Queue | None = None
+_worker: asyncio.Task | None = None
+_flushes: set[asyncio.Task] = set()  # strong refs so flush tasks aren't GC'd mid-flight
+
+
+async def classify_batched(messages: list[dict], **kwargs) -> str:
+    """Queue one call_llm request and wait for its batch to be flushed."""
+    global _queue, _worker
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if _worker is None or _worker.done():
+        _worker = asyncio.create_task(_collect())
+
+    future = asyncio.get_running_loop().create_future()
+    await _queue.put((messages, kwargs, future))
+    return await future
+
+
+async def _collect():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_S
+        while len(batch) < BATCH_MAX_ITEMS:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Flush in the background so the next batch can start collecting
+        task = asyncio.create_task(_flush(batch))
+        _flushes.add(task)
+        task.add_done_callback(_flushes.discard)
+
+
+async def _flush(batch: list[tuple]):
+    # Group identical requests so each distinct payload is sent once
+    groups: dict[str, list[asyncio.Future]] = {}
+    payloads: dict[str, tuple] = {}
+    for messages, kwargs, future in batch:
+        key = json.dumps([messages, kwargs], sort_keys=True, default=str)
+        groups.setdefault(key, []).append(future)
+        payloads[key] = (messages, kwargs)
+
+    keys = list(groups)
+    results = await asyncio.gather(
+        *(call_llm(payloads[k][0], **payloads[k][1]) for k in keys),
+        return_exceptions=True,
+    )
+    for key, result in zip(keys, results):
+        for future in groups[key]:
+            if future.done():  # caller went away
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
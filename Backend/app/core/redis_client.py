@@ -1,5 +1,6 @@
 import os
 import redis
+import redis.asyncio
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -12,16 +13,24 @@ REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_DB = int(os.getenv("REDIS_DB", 0))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+# Upper bound on pooled connections per client, so a burst of chats queues for a
+# connection instead of opening one socket per request
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
 
-def get_redis_client():
-    """Returns a standalone Redis client, supporting URL or Host/Port."""
+def get_redis_client(client_class=redis.Redis):
+    """Returns a standalone Redis client, supporting URL or Host/Port.
+
+    `client_class` picks the flavour: redis.Redis (blocking) or
+    redis.asyncio.Redis (awaitable, for use inside async handlers).
+    """
     if REDIS_URL:
         # Use from_url for easy SSL/auth support (rediss:// for SSL)
-        return redis.Redis.from_url(
+        return client_class.from_url(
             REDIS_URL,
             decode_responses=True,
             socket_timeout=5,
-            retry_on_timeout=True
+            retry_on_timeout=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
         )
     
     # Fallback to Host/Port/DB/Password
@@ -29,14 +38,15 @@ def get_redis_client():
     # Better to pass None if empty string.
     password = REDIS_PASSWORD if REDIS_PASSWORD and REDIS_PASSWORD.strip() else None
     
-    return redis.Redis(
+    return client_class(
         host=REDIS_HOST,
         port=REDIS_PORT,
         db=REDIS_DB,
         password=password,
         decode_responses=True,
         socket_timeout=5,
-        retry_on_timeout=True
+        retry_on_timeout=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
     )
 
 # Global client singleton
@@ -47,3 +57,10 @@ try:
 except Exception as e:
     print(f"[REDIS ERROR] Failed to initialize client: {e}")
     redis_client = None
+
+# Async client for request handlers, so cache reads/writes don't block the event loop
+try:
+    async_redis_client = get_redis_client(redis.asyncio.Redis)
+except Exception as e:
+    print(f"[REDIS ERROR] Failed to initialize async client: {e}")
+    async_redis_client = None
@@ -1,9 +1,12 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 load_dotenv()
 
@@ -13,11 +16,21 @@ from app.api.v1.analytics import router as analytics_router
 
 # Import analytics engine for pre-loading
 from app.analytics import engine as analytics_engine
+from app.core import llm
+
+try:
+    from app.core.redis_client import async_redis_client
+except Exception:
+    async_redis_client = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load the UPI dataset once at startup so all requests share the same DataFrame."""
+    # asyncio.to_thread (used for pandas queries) runs on the default executor
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=2 * (os.cpu_count() or 1) + 1, thread_name_prefix="analytics")
+    )
     print("[INFO] Loading UPI transactions dataset...")
     try:
         df = analytics_engine.load_data()
@@ -25,8 +38,12 @@ async def lifespan(app: FastAPI):
         print(f"   Columns: {', '.join(df.columns.tolist())}")
     except Exception as e:
         print(f"[WARNING] Failed to load dataset: {e}")
+    llm.get_session()  # open the pooled OpenRouter session inside the running loop
     yield
     print("[STOP] Shutting down...")
+    await llm.close_session()
+    if async_redis_client is not None:
+        await async_redis_client.aclose()
 
 
 app = FastAPI(
@@ -34,6 +51,7 @@ app = FastAPI(
     description="Conversational Analytics Engine for UPI Transactions",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # ── CORS ─────────────────────────────────────────────────────────────────────
@@ -5,8 +5,8 @@ try:
     print("[SUCCESS] uvicorn imported")
     import sentence_transformers
     print("[SUCCESS] sentence_transformers imported")
-    import sklearn
-    print("[SUCCESS] sklearn imported")
+    import numba
+    print("[SUCCESS] numba imported")
     from app.analytics.rag_engine import rag_engine
     print("[SUCCESS] RAGEngine initialized")
     print("All backend dependencies are present.")
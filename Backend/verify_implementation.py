@@ -1,44 +1,193 @@
+"""
+End-to-end smoke check for Redis and the RAG path.
+Run from the Backend directory: `python verify_implementation.py` (the script's own
+directory is already first on sys.path, so `app` imports resolve without any path setup).
+"""
+
 import asyncio
+import hashlib
+import json
 import os
 import sys
+import time
+import traceback
+
+from redis.exceptions import RedisError
 
-# Add the project root to sys.path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# uvloop is optional — the default asyncio loop is used without it
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-from app.analytics.rag_engine import rag_engine
-from app.core.redis_client import redis_client
+from app.analytics.rag_engine import CSV_PATH, INDEX_PATH, rag_engine
+from app.core import llm
+from app.core.redis_client import async_redis_client
 from app.analytics.explainability import generate_rag_response
 
+# Retrieval results for the fixed verification query, so repeat runs skip the
+# embedding + search. Only the context string and document count are kept; an entry
+# is reused only while the data behind retrieval hashes the same.
+RETRIEVAL_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage", "verify_cache.json")
+RETRIEVAL_CACHE_TTL_S = 86400
+
+# Latency budgets, so a stuck dependency fails the run instead of hanging it. Retrieval
+# is generous because the first run loads (and may download) the embeddings model;
+# the same budget bounds the preload that does that.
+REDIS_TIMEOUT_S = 5.0
+RETRIEVAL_TIMEOUT_S = float(os.getenv("VERIFY_RETRIEVAL_TIMEOUT_S", 120))
+LLM_TIMEOUT_S = 30.0
+
+def _load_retrieval_cache() -> dict:
+    try:
+        with open(RETRIEVAL_CACHE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _source_digest() -> str:
+    """sha256 of the FAISS index files if present, else of the CSV the keyword search reads."""
+    if os.path.isdir(INDEX_PATH):
+        paths = sorted(os.path.join(INDEX_PATH, name) for name in os.listdir(INDEX_PATH))
+    else:
+        paths = [CSV_PATH] if os.path.exists(CSV_PATH) else []
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+    return digest.hexdigest()
+
+async def cached_retrieval(query: str) -> tuple[str, int, bool]:
+    """Return (context, n_docs, from_cache) for `query`."""
+    key = hashlib.blake2b(query.encode(), digest_size=16).hexdigest()
+    cache = _load_retrieval_cache()
+    source = await asyncio.to_thread(_source_digest)
+    entry = cache.get(key)
+    if entry and entry["expires"] > time.time() and entry.get("source") == source:
+        return entry["context"], entry["n_docs"], True
+
+    context, docs = await rag_engine.query(query)
+    cache[key] = {
+        "context": context,
+        "n_docs": len(docs),
+        "source": source,
+        "expires": time.time() + RETRIEVAL_CACHE_TTL_S,
+    }
+    try:
+        with open(RETRIEVAL_CACHE, "w") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Could not write retrieval cache: {e}")
+    return context, len(docs), False
+
 async def test_rag():
-    print("--- Testing RAG Engine ---")
+    # Lines are collected and written once, so the section stays in one block
+    # even while it runs alongside test_redis
+    out = ["--- Testing RAG Engine ---"]
     query = "What patterns are visible in high-value fraud transactions?"
+    # The LLM connection is set up while retrieval runs, so the answer step
+    # starts on a warm pooled connection
+    warm = asyncio.create_task(llm.warmup())
     try:
-        context, docs = await rag_engine.query(query)
-        print(f"Retrieved {len(docs)} documents.")
-        print(f"Context snippet: {context[:200]}...")
+        context, n_docs, from_cache = await asyncio.wait_for(cached_retrieval(query), RETRIEVAL_TIMEOUT_S)
+        if from_cache:
+            out.append("RAG: index unchanged (sha256 match), reusing cached retrieval")
+        out.append(f"Retrieved {n_docs} documents.")
+        out.append(f"Context snippet: {context[:200]}...")
         
-        print("\n--- Generating RAG Response ---")
-        answer = await generate_rag_response(query, context)
-        print(f"Answer: {answer}")
-    except Exception as e:
-        print(f"RAG Test Failed: {e}")
-
-def test_redis():
-    print("\n--- Testing Redis Connectivity ---")
-    if redis_client is None:
-        print("Redis Connectivity: SKIPPED (redis_client is None, falling back to in-memory)")
+        out.append("\n--- Generating RAG Response ---")
+        # Skip the LLM step outright when it can't succeed, instead of waiting
+        # out its timeout and the model fallbacks
+        if not llm.OPENROUTER_API_KEY:
+            out.append("RAG Response: SKIPPED (OPENROUTER_API_KEY is not set)")
+            return
+        if not await warm:
+            out.append("RAG Response: SKIPPED (OpenRouter unreachable)")
+            return
+        answer = await asyncio.wait_for(generate_rag_response(query, context), LLM_TIMEOUT_S)
+        out.append(f"Answer: {answer}")
+    except TimeoutError:
+        out.append("RAG Test Failed: timed out")
+    except OSError as e:
+        out.append(f"RAG Test Failed: {e}")
+    finally:
+        await warm  # never raises; don't leave it running into session shutdown
+        sys.stdout.write("\n".join(out) + "\n")
+
+# Canned questions for the batched retrieval check
+VERIFY_QUERIES = [
+    "What patterns are visible in high-value fraud transactions?",
+    "Which merchant categories see the most failed transactions?",
+    "How does transaction volume change late at night?",
+    "Are weekend transactions riskier than weekday ones?",
+]
+
+async def test_rag_batch():
+    out = ["\n--- Testing Batched Retrieval ---"]
+    try:
+        results = await asyncio.wait_for(rag_engine.query_batch(VERIFY_QUERIES), RETRIEVAL_TIMEOUT_S)
+        for query, (context, docs) in zip(VERIFY_QUERIES, results):
+            out.append(f"{len(docs)} docs, {len(context)} chars of context: {query}")
+    except TimeoutError:
+        out.append("Batched Retrieval Failed: timed out")
+    except OSError as e:
+        out.append(f"Batched Retrieval Failed: {e}")
+    finally:
+        sys.stdout.write("\n".join(out) + "\n")
+
+async def rag_checks():
+    # Model and index load happen here, overlapping the Redis check, so the
+    # retrieval budgets below only cover retrieval itself
+    try:
+        has_index = await asyncio.wait_for(asyncio.to_thread(rag_engine.preload), RETRIEVAL_TIMEOUT_S)
+        sys.stdout.write(f"RAG preload: {'vector index' if has_index else 'keyword search (no index)'}\n")
+    except TimeoutError:
+        sys.stdout.write("RAG preload: timed out, loading on first query\n")
+    # Sequential so the two checks share the loaded model/index
+    await test_rag()
+    await test_rag_batch()
+
+async def test_redis():
+    out = ["\n--- Testing Redis Connectivity ---"]
+    if async_redis_client is None:
+        out.append("Redis Connectivity: SKIPPED (redis_client is None, falling back to in-memory)")
+        sys.stdout.write("\n".join(out) + "\n")
         return
     try:
-        redis_client.set("test_key", "test_value")
-        val = redis_client.get("test_key")
-        print(f"Redis test_key: {val}")
+        # SET and GET go out together in one non-transactional round trip
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.set("test_key", "test_value")
+            pipe.get("test_key")
+            _, val = await asyncio.wait_for(pipe.execute(), REDIS_TIMEOUT_S)
+        out.append(f"Redis test_key: {val}")
         if val == "test_value":
-            print("Redis connectivity: OK")
+            out.append("Redis connectivity: OK")
         else:
-            print("Redis connectivity: DATA MISMATCH")
-    except Exception as e:
-        print(f"Redis Connectivity: FAILED (Falling back to in-memory) - Error: {e}")
+            out.append("Redis connectivity: DATA MISMATCH")
+    except TimeoutError:
+        out.append("Redis Connectivity: FAILED (Falling back to in-memory) - timed out")
+    except (RedisError, OSError) as e:
+        out.append(f"Redis Connectivity: FAILED (Falling back to in-memory) - Error: {e}")
+    finally:
+        sys.stdout.write("\n".join(out) + "\n")
+
+async def main() -> int:
+    """Run all checks; returns the process exit code (1 if any check raised unexpectedly)."""
+    try:
+        # Independent checks — overlap the Redis round trip with retrieval + LLM.
+        # Expected failures (timeouts, connection errors) are reported by each check;
+        # anything else is collected here so one doesn't cancel the other.
+        results = await asyncio.gather(test_redis(), rag_checks(), return_exceptions=True)
+    finally:
+        # Same shared clients the app uses; closed once here, as the app's lifespan does
+        await llm.close_session()
+        if async_redis_client is not None:
+            await async_redis_client.aclose()
+
+    errors = [r for r in results if isinstance(r, BaseException)]
+    for error in errors:
+        traceback.print_exception(error)
+    return 1 if errors else 0
 
 if __name__ == "__main__":
-    test_redis()
-    asyncio.run(test_rag())
+    sys.exit(asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None))
@@ -251,12 +251,12 @@ export default function Dashboard() {
 
 
 function RiskHeatmap() {
-    const [data, setData] = useState([]);
+    const [data, setData] = useState({ states: [], slots: [], values: [] });
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
         fetchHeatmapData().then(res => {
-            setData(res.data || []);
+            if (res.states) setData(res);
             setLoading(false);
         }).catch(() => setLoading(false));
     }, []);
@@ -273,8 +273,7 @@ function RiskHeatmap() {
         </Card>
     );
 
-    const states = [...new Set(data.map(d => d.state))];
-    const times = ["Morning", "Afternoon", "Evening", "Night"];
+    const { states, slots: times, values } = data;
 
     return (
         <Card className="border-none shadow-md rounded-2xl bg-white overflow-hidden h-full transition-all duration-300 hover:shadow-2xl hover:shadow-red-600/40">
@@ -304,11 +303,11 @@ function RiskHeatmap() {
                             ))}
                         </div>
                         <div className="space-y-2">
-                            {states.map(state => (
+                            {states.map((state, i) => (
                                 <div key={state} className="grid grid-cols-5 gap-2 items-center">
                                     <div className="text-xs font-medium text-gray-600 truncate">{state}</div>
-                                    {times.map(time => {
-                                        const val = data.find(d => d.state === state && d.time === time)?.value || 0;
+                                    {times.map((time, j) => {
+                                        const val = values[i]?.[j] || 0;
                                         return (
                                             <motion.div
                                                 key={time}